@@ -1,5 +1,5 @@
 // app/(tabs)/index.tsx
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import {
   View,
   SafeAreaView,
@@ -39,6 +39,9 @@ export default function Index() {
   const [tags, setTags] = useState<Tag[]>([]);
   const [selectedCategory, setSelectedCategory] = useState<Tag | null>(null);
   const [experiences, setExperiences] = useState<Experience[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const selectedTagRef = useRef<number | null>(null);
   const router = useRouter();
   const authFetch = useAuthFetch();
 
@@ -76,32 +79,54 @@ export default function Index() {
     setSelectedCategory(tags[0]);
   }, [tags]);
 
+  // Fetch a page of the selected category's experiences. The listing is
+  // paginated, so the carousel asks for the next page with the previous
+  // page's next_cursor as it nears the end.
+  const fetchExperiences = async (tagId: number, cursor: string | null) => {
+    setLoadingMore(true);
+    try {
+      const params = new URLSearchParams({ tag: tagId.toString() });
+      if (cursor) params.append("cursor", cursor);
+      const response = await authFetch(`${FLASK_URL}/experiences/?${params}`, {
+        method: "GET",
+        headers: { "Content-Type": "application/json" },
+        credentials: "include",
+      });
+
+      if (response.ok) {
+        const data = await response.json();
+        // Drop pages for a category that is no longer selected
+        if (selectedTagRef.current !== tagId) return;
+        setExperiences((previous) =>
+          cursor ? [...previous, ...data.experiences] : data.experiences
+        );
+        setNextCursor(data.next_cursor);
+      } else {
+        console.error("Failed to fetch:", response.status);
+      }
+    } catch (e) {
+      console.error("There was an error:", e);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   // Update experiences when category changes
   useEffect(() => {
     if (!selectedCategory) return
 
-    const fetchExpereinces = async () => {
-      try {
-        const response = await authFetch(`${FLASK_URL}/experiences/tag/${selectedCategory.id}`, {
-          method: "GET",
-          headers: { "Content-Type": "application/json" },
-          credentials: "include",
-        });
-
-        if (response.ok) {
-          const data = await response.json();
-          setExperiences(data.experiences);
-        } else {
-          console.error("Failed to fetch:", response.status);
-        }
-      } catch (e) {
-        console.error("There was an error:", e);
-      }
-    };
-
-    fetchExpereinces();
+    selectedTagRef.current = selectedCategory.id;
+    setExperiences([]);
+    setNextCursor(null);
+    fetchExperiences(selectedCategory.id, null);
   }, [selectedCategory]);
 
+  const handleEndReached = () => {
+    if (selectedCategory && nextCursor && !loadingMore) {
+      fetchExperiences(selectedCategory.id, nextCursor);
+    }
+  };
+
   const handleSearch = () => {
     if (searchText.trim()) {
       router.push({
@@ -194,6 +219,8 @@ export default function Index() {
                 );
               }}
               onScroll={onScroll}
+              onEndReached={handleEndReached}
+              onEndReachedThreshold={0.5}
               scrollEventThrottle={16.6}
               showsHorizontalScrollIndicator={false}
             />
@@ -2,7 +2,7 @@ from models import User, Bundle, Experience, Booking, Review
 from config import Config
 from datetime import datetime, date
 from functools import wraps
-from extensions import app, db
+from extensions import app, db, migrate
 from routes.api import api
 from routes.experiences import experiences
 from routes.reviews import reviews_bp
@@ -10,12 +10,25 @@ from routes.images import images
 from routes.schedules import schedules
 from routes.bookings import bookings
 from routes.tags import tags
-from routes.search import search
+from routes.search import search, get_search_backend
 from routes.payments import payments
 from routes.payment_methods import payment_methods
+from routes.idempotency import purge_expired_idempotency_keys
+from search_index import search_index
+from suggest_index import suggest_index
+from db_pool import instrument_engine, pool_metrics
+from response_cache import response_cache
+from json_provider import init_json_provider
+from metrics import metrics_response
+from passwords import password_pool
+from flask import jsonify
+from sqlalchemy import text
 
 
 db.init_app(app)
+migrate.init_app(app, db)
+response_cache.init_app(app)
+init_json_provider(app)
 
 app.register_blueprint(api, url_prefix='/api')
 app.register_blueprint(experiences, url_prefix='/experiences')
@@ -30,7 +43,48 @@ app.register_blueprint(payment_methods, url_prefix='/payment_methods')
 
 
 with app.app_context():
+    for engine in db.engines.values():
+        instrument_engine(engine, app.config['DB_STATEMENT_TIMEOUT_MS'])
     db.create_all()
+    suggest_index.build()
+    if get_search_backend() is search_index:
+        search_index.build()
+
+# Database reachability, connection pool checkout and wait metrics, and the
+# password hashing pool's queue
+@app.route('/health', methods=['GET'])
+def health():
+    try:
+        db.session.execute(text('SELECT 1'))
+        database = 'ok'
+    except Exception as e:
+        print(f"Health check failed: {e}")
+        database = 'unavailable'
+
+    return jsonify({
+        'database': database,
+        'pool': pool_metrics.stats(db.engine.pool),
+        'password_pool': password_pool.stats()
+    }), 200 if database == 'ok' else 503
+
+# Request metrics in Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return metrics_response()
+
+@app.cli.command('repair-ratings')
+def repair_ratings():
+    """Recompute every experience's review_count, rating_sum and average_rating"""
+    Experience.refresh_rating_aggregates()
+    db.session.commit()
+    response_cache.clear()
+    print("Rating aggregates rebuilt")
+
+@app.cli.command('purge-idempotency-keys')
+def purge_idempotency_keys():
+    """Delete stored Idempotency-Key responses older than a day"""
+    deleted = purge_expired_idempotency_keys()
+    print(f"Deleted {deleted} expired idempotency keys")
 
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=5001, debug=True)
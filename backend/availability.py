@@ -0,0 +1,168 @@
+import time
+from calendar import monthrange
+from datetime import timedelta
+from threading import Lock
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Booking, ExperienceSchedule, Reservation
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# Booked-guest counts are kept per experience for this long. Commits in this
+# process invalidate them right away; the TTL bounds how stale another
+# worker's writes can look.
+BOOKED_TTL_SECONDS = 30
+
+def parse_days_of_week(days_of_week):
+    days = set()
+    for day in (days_of_week or '').split(','):
+        day = day.strip().lower()
+        if day in WEEKDAYS:
+            days.add(WEEKDAYS.index(day))
+    return days
+
+def booked_guests_query(experience_id):
+    return (
+        select(Reservation.date, func.sum(Booking.number_of_guests))
+        .join(Booking, Booking.id == Reservation.booking_id)
+        .where(
+            Booking.experience_id == experience_id,
+            Booking.status != 'cancelled',
+            Reservation.status != 'cancelled'
+        )
+        .group_by(Reservation.date)
+    )
+
+def expand_schedule(schedule, start, end):
+    """Dates in [start, end] on which the schedule runs. Experiences run once a
+    day from start_time to end_time, so each date is one slot.
+
+    'None' runs every day from start_date to end_date, 'Weekly' on the listed
+    days_of_week, 'Monthly' on start_date's day of the month (the 1st when it
+    has no start_date). 'Daily' and 'Custom' (guest picks the date) run every
+    day within whatever bounds are set."""
+    pattern = (schedule.recurring_pattern or 'Custom').lower()
+    if pattern == 'none' and not schedule.start_date:
+        return []
+
+    if schedule.start_date:
+        start = max(start, schedule.start_date)
+    if schedule.end_date:
+        end = min(end, schedule.end_date)
+    elif pattern == 'none':
+        end = min(end, schedule.start_date)
+
+    weekdays = parse_days_of_week(schedule.days_of_week) if pattern == 'weekly' else None
+    month_day = schedule.start_date.day if schedule.start_date else 1
+
+    dates = []
+    day = start
+    while day <= end:
+        if weekdays is not None:
+            runs = day.weekday() in weekdays
+        elif pattern == 'monthly':
+            # Short months run on their last day instead of skipping
+            runs = day.day == min(month_day, monthrange(day.year, day.month)[1])
+        else:
+            runs = True
+        if runs:
+            dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+
+class AvailabilityIndex:
+    """Per-experience map of date -> booked guests, loaded with one grouped
+    query the first time an experience is asked for and then served from
+    memory until a booking or reservation change invalidates it."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.booked = {}
+
+    def booked_guests(self, experience_id):
+        with self.lock:
+            entry = self.booked.get(experience_id)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+
+        rows = db.session.execute(booked_guests_query(experience_id)).all()
+        booked = {day: int(guests) for day, guests in rows}
+
+        with self.lock:
+            self.booked[experience_id] = (time.monotonic() + BOOKED_TTL_SECONDS, booked)
+        return booked
+
+    def invalidate(self, experience_id):
+        with self.lock:
+            self.booked.pop(experience_id, None)
+
+    def slots(self, schedule, start, end):
+        booked = self.booked_guests(schedule.experience_id)
+        capacity = schedule.capacity
+
+        return [{
+            'date': day.isoformat(),
+            'start_time': schedule.start_time.isoformat() if schedule.start_time else None,
+            'end_time': schedule.end_time.isoformat() if schedule.end_time else None,
+            'capacity': capacity,
+            'booked': booked.get(day, 0),
+            'available': None if capacity is None else max(0, capacity - booked.get(day, 0))
+        } for day in expand_schedule(schedule, start, end)]
+
+
+def lock_slots(experience_id, dates):
+    # Serializes bookings for the same experience and day across workers until
+    # the transaction ends. Locks are taken in date order so two bookings
+    # can't deadlock on each other.
+    if db.session.get_bind().dialect.name == 'postgresql':
+        for day in sorted(set(dates)):
+            db.session.execute(select(func.pg_advisory_xact_lock(experience_id, day.toordinal())))
+    else:
+        db.session.execute(
+            select(ExperienceSchedule.id)
+            .where(ExperienceSchedule.experience_id == experience_id)
+            .with_for_update()
+        )
+
+def full_slots(schedule, dates, guests, exclude_booking_id=None):
+    """Dates that can't take `guests` more guests. Call after lock_slots: the
+    counts are read straight from the database, not from the cached index."""
+    if schedule is None or schedule.capacity is None or not dates:
+        return []
+
+    query = booked_guests_query(schedule.experience_id).where(Reservation.date.in_(set(dates)))
+    if exclude_booking_id is not None:
+        query = query.where(Booking.id != exclude_booking_id)
+    booked = {day: int(count) for day, count in db.session.execute(query).all()}
+
+    return sorted(day for day in set(dates) if booked.get(day, 0) + guests > schedule.capacity)
+
+
+availability_index = AvailabilityIndex()
+
+# Any booking or reservation written in a transaction invalidates its
+# experience's counts once the transaction commits
+@event.listens_for(Session, 'after_flush')
+def collect_booked_changes(session, flush_context):
+    changed = session.info.setdefault('availability_changed', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, Booking):
+            changed.add(instance.experience_id)
+        elif isinstance(instance, Reservation) and instance.booking is not None:
+            changed.add(instance.booking.experience_id)
+
+def mark_booked_changed(experience_id):
+    # Bulk INSERT/DELETE statements skip the flush above, so callers issuing
+    # them record the experience themselves
+    db.session.info.setdefault('availability_changed', set()).add(experience_id)
+
+@event.listens_for(Session, 'after_commit')
+def apply_booked_changes(session):
+    for experience_id in session.info.pop('availability_changed', ()):
+        availability_index.invalidate(experience_id)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_booked_changes(session):
+    session.info.pop('availability_changed', None)
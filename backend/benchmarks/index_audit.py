@@ -0,0 +1,181 @@
+"""EXPLAIN the per-user and per-experience lookups the blueprints run, and
+the /experiences/ listing with each sort and filter, and fail if any of them
+reads a whole table.
+
+Each check is built from the same helpers the routes use where they exist.
+Run it against a database loaded with a large fixture: on a few hundred rows
+Postgres rightly prefers sequential scans, so small tables prove nothing.
+SQLite plans are checked too (EXPLAIN QUERY PLAN), which is handy in CI.
+
+    python benchmarks/index_audit.py
+    python benchmarks/index_audit.py --database-url sqlite:////tmp/load.db
+
+Exits 1 when a check scans one of the tables it names.
+"""
+import argparse
+import os
+import re
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from sqlalchemy import select, text
+from werkzeug.datastructures import MultiDict
+
+# A LIMIT closing the outermost statement
+OUTER_LIMIT = re.compile(r'\bLIMIT \d+(?: OFFSET \d+)?\s*$')
+
+def listing_checks():
+    from routes.experiences import PAGE_COLUMNS, encode_cursor, filter_experiences, page_limit, sort_experiences
+
+    # Query strings of /experiences/ requests
+    listings = [
+        ('first page', {}),
+        ('first page by title', {'sort': 'title'}),
+        ('first page by price', {'sort': 'price'}),
+        ('first page by rating', {'sort': '-rating'}),
+        ('next page', {'cursor': encode_cursor(20, 20)}),
+        ('next page by title', {'sort': 'title', 'cursor': encode_cursor('M', 20)}),
+        ('tag filter', {'tag': '1'}),
+        ('location filter', {'location': 'par'}),
+        ('price filter', {'sort': 'price', 'min_price': '50', 'max_price': '200'}),
+        ('rating filter', {'sort': '-rating', 'min_rating': '4'}),
+    ]
+    checks = []
+    for name, query_string in listings:
+        args = MultiDict(query_string)
+        statement, _ = sort_experiences(filter_experiences(select(*PAGE_COLUMNS), args), args)
+        tables = ['experiences', 'experience_tags'] if 'tag' in args else ['experiences']
+        checks.append((f"experiences listing: {name}", statement.limit(page_limit(args) + 1), tables))
+    return checks
+
+def booking_checks(args):
+    from routes.bookings import DEFAULT_PAGE_SIZE, booking_rows_query
+
+    now = datetime.now(timezone.utc)
+    tables = ['bookings', 'reservations', 'experience_schedules']
+    return [
+        ('my bookings', booking_rows_query(args.user_id, now), tables),
+        ('my current bookings', booking_rows_query(args.user_id, now, 'current', None, DEFAULT_PAGE_SIZE + 1), tables),
+        ('my past bookings, next page', booking_rows_query(args.user_id, now, 'past', 1000, DEFAULT_PAGE_SIZE + 1), tables),
+    ]
+
+def review_checks(args):
+    from models import Review
+    from routes.reviews import filter_reviews, page_reviews
+
+    checks = []
+    for name, query_string in [
+        ('reviews of an experience', {'experience_id': args.experience_id}),
+        ('reviews of an experience, next page', {'experience_id': args.experience_id, 'cursor': 1000}),
+        ('reviews by an author', {'user_id': args.user_id}),
+    ]:
+        query_args = MultiDict(query_string)
+        statement, _ = page_reviews(filter_reviews(Review.list_query(), query_args), query_args)
+        checks.append((name, statement, ['reviews']))
+    return checks
+
+def build_checks(args):
+    from availability import booked_guests_query
+    from models import (
+        Experience, ExperienceImage, Payment, PaymentMethod, Reservation, Tag,
+        bundle_experience, experience_tag
+    )
+
+    days = [date.today() + timedelta(days=n) for n in range(7)]
+    # (name, statement, tables it must not scan)
+    return listing_checks() + booking_checks(args) + review_checks(args) + [
+        ('booked guests per date',
+         booked_guests_query(args.experience_id).where(Reservation.date.in_(days)),
+         ['bookings', 'reservations']),
+        ('reservations of loaded bookings',
+         select(Reservation).where(Reservation.booking_id.in_([1, 2, 3])),
+         ['reservations']),
+        ('images of an experience',
+         select(ExperienceImage).where(ExperienceImage.experience_id == args.experience_id),
+         ['experience_images']),
+        ('experiences with a tag',
+         select(Experience.id).join(Experience.tags).where(Tag.id == 1),
+         ['experience_tags']),
+        ('tags of loaded experiences',
+         select(experience_tag.c.tag_id).where(experience_tag.c.experience_id.in_([1, 2, 3])),
+         ['experience_tags']),
+        ('experiences in a bundle',
+         select(bundle_experience.c.experience_id).where(bundle_experience.c.bundle_id == 1),
+         ['bundle_experiences']),
+        ('visible payment methods',
+         select(PaymentMethod).where(PaymentMethod.user_id == args.user_id, PaymentMethod.hidden.is_(False))
+         .order_by(PaymentMethod.id),
+         ['payment_methods']),
+        ('payments of a user',
+         select(Payment).where(Payment.user_id == args.user_id),
+         ['payments']),
+    ]
+
+def postgres_scans(session, sql):
+    plan = session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    scans = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            scans.append(node['Relation Name'])
+        nodes.extend(node.get('Plans', []))
+    return scans
+
+def sqlite_scans(session, sql):
+    # Rows read like "SCAN bookings" for a full scan and
+    # "SEARCH bookings USING INDEX ..." or "SCAN t USING COVERING INDEX ..." otherwise.
+    # The one exception is a LIMIT query that needs no sort step: its outer
+    # "SCAN t" walks the rowid in order and stops after the page, the way a
+    # Postgres Limit over an Index Scan on the primary key does.
+    details = [row.detail for row in session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    walks_in_order = OUTER_LIMIT.search(sql) and not any('USE TEMP B-TREE FOR ORDER BY' in d for d in details)
+    scans = []
+    for position, detail in enumerate(details):
+        words = detail.split()
+        if words[0] == 'SCAN' and 'USING' not in words and not (position == 0 and walks_in_order):
+            scans.append(words[1])
+    return scans
+
+def audit(session, checks):
+    """Returns (check name, tables it scanned) for every check, in order."""
+    dialect = session.get_bind().dialect
+    find_scans = postgres_scans if dialect.name == 'postgresql' else sqlite_scans
+    results = []
+    for name, statement, tables in checks:
+        sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+        results.append((name, sorted(set(find_scans(session, sql)) & set(tables))))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='defaults to the DB_* environment the app uses')
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument('--experience-id', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.database_url:
+        config.Config.SQLALCHEMY_DATABASE_URI = args.database_url
+
+    # Imported after the database URL is set, since importing extensions reads it
+    from app import app
+    from extensions import db
+
+    failures = 0
+    with app.app_context():
+        results = audit(db.session, build_checks(args))
+    for name, scanned in results:
+        if scanned:
+            failures += 1
+            print(f"FAIL {name}: sequential scan on {', '.join(scanned)}")
+        else:
+            print(f"ok   {name}")
+
+    print(f"{failures} of {len(results)} checks scan a table" if failures else 'No sequential scans')
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
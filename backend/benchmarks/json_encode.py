@@ -0,0 +1,92 @@
+"""Encode time for the /experiences/ payload with each JSON provider.
+
+Builds experiences in memory (no database) with images, tags, a schedule and
+reviews, then times to_dict and the provider's dumps separately, at 1k and
+10k rows by default.
+
+    python benchmarks/json_encode.py --rows 1000 10000 --profile full
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime, time as clock
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import app
+from json_provider import OrjsonProvider, StdlibJSONProvider
+from models import EXPERIENCE_PROFILES, Experience, ExperienceImage, ExperienceSchedule, Review, Tag, User
+
+def make_experiences(count):
+    tags = [Tag(id=i, name=f"tag {i}", description='Tag description') for i in range(1, 11)]
+    users = [User(id=i, first_name='First', last_name=f"Last {i}") for i in range(1, 51)]
+    experiences = []
+    for i in range(1, count + 1):
+        experience = Experience(
+            id=i,
+            title=f"Experience {i}",
+            description='A long description of the experience ' * 5,
+            location='New York, NY',
+            price=Decimal('199.99'),
+            average_rating=Decimal('4.50'),
+            review_count=3
+        )
+        experience.images = [ExperienceImage(id=i * 10 + n, image_url=f"https://example.com/{i}/{n}.jpg") for n in range(3)]
+        experience.tags = tags[i % 10:i % 10 + 2]
+        experience.schedule = ExperienceSchedule(
+            id=i,
+            start_date=date(2026, 1, 1),
+            end_date=date(2026, 12, 31),
+            recurring_pattern='Weekly',
+            days_of_week='Friday,Saturday',
+            start_time=clock(19, 0),
+            end_time=clock(23, 0),
+            capacity=20
+        )
+        experience.reviews = [Review(
+            id=i * 10 + n,
+            user_id=users[n].id,
+            user=users[n],
+            experience_id=i,
+            rating=4 + n % 2,
+            comment='Great night out.',
+            timestamp=datetime(2026, 5, 1, 20, 30)
+        ) for n in range(3)]
+        experiences.append(experience)
+    return experiences
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--profile', choices=list(EXPERIENCE_PROFILES), default='full')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    providers = {'stdlib': StdlibJSONProvider(app), 'orjson': OrjsonProvider(app)}
+    print(f"profile={args.profile}, best of {args.repeat}")
+    print(f"{'rows':>7} {'to_dict ms':>11} " + ' '.join(f"{name + ' ms':>10}" for name in providers) + f" {'bytes':>10}")
+
+    for count in args.rows:
+        experiences = make_experiences(count)
+        to_dict_time, payload = best_of(args.repeat, lambda: {
+            'experiences': [experience.to_dict(args.profile) for experience in experiences],
+            'next_cursor': None
+        })
+        timings = {}
+        for name, provider in providers.items():
+            timings[name], body = best_of(args.repeat, lambda: provider.dumps(payload))
+        print(f"{count:>7} {to_dict_time * 1000:>11.1f} " +
+              ' '.join(f"{timings[name] * 1000:>10.1f}" for name in providers) + f" {len(body):>10}")
+
+if __name__ == '__main__':
+    main()
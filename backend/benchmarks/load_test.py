@@ -0,0 +1,273 @@
+"""Replay user scenarios against the app and report p50/p95/p99 latency and
+throughput per step.
+
+Scenarios, picked at random by weight on every iteration of each virtual
+user:
+  typeahead    /search/suggest for a growing prefix, then /search
+  browse       catalog pages, an experience, its reviews and availability
+  checkout     availability, then POST /bookings/ for an open slot
+  my_bookings  current and past bookings, payment methods and payments
+
+Virtual users log in as the synthetic users from synthetic_data.py, so load
+that first. Requests go through Flask's test client in this process unless
+--url points at a running server (e.g. gunicorn), which is what a baseline
+should be taken against.
+
+    python benchmarks/load_test.py --duration 60 --concurrency 16 --url http://localhost:5000
+    python benchmarks/load_test.py --scenario browse checkout --save baseline.json
+    python benchmarks/load_test.py --compare baseline.json --tolerance 0.2
+
+With --compare it exits 1 when a step's p95 grew, or the overall throughput
+fell, by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from synthetic_data import ACTIVITIES, CITIES, LOAD_TEST_PASSWORD
+
+SCENARIO_WEIGHTS = {'typeahead': 3, 'browse': 4, 'checkout': 1, 'my_bookings': 2}
+SORTS = ['id', '-rating', 'price', '-price', 'title']
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, headers, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        if data is not None:
+            request.add_header('Content-Type', 'application/json')
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class AppClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, headers, body=None):
+        response = self.client.open(path, method=method, headers=headers, json=body)
+        return response.status_code, response.get_data()
+
+
+class VirtualUser:
+    """One simulated client: its login, a random stream and the latencies of
+    every step it ran."""
+
+    def __init__(self, client, user_number, seed):
+        self.client = client
+        self.user_number = user_number
+        self.rng = random.Random(seed)
+        self.headers = {}
+        self.user_id = None
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def call(self, step, method, path, body=None, ok=(200,)):
+        started = time.perf_counter()
+        status, raw = self.client.request(method, path, self.headers, body)
+        self.samples[step].append(time.perf_counter() - started)
+        if status not in ok:
+            self.errors[step] += 1
+            return status, None
+        return status, json.loads(raw) if raw else None
+
+    def login(self):
+        _, body = self.call('login', 'POST', '/api/login', {
+            'email': f"loadtest{self.user_number}@example.com",
+            'password': LOAD_TEST_PASSWORD
+        })
+        if not body:
+            raise RuntimeError(f"Couldn't log in as loadtest{self.user_number}@example.com; load synthetic_data.py first")
+        self.headers = {'Authorization': f"Bearer {body['token']}"}
+        self.user_id = body['user']['userId']
+
+    def pick_experience(self):
+        _, body = self.call('browse: list', 'GET', f"/experiences/?profile=card&sort={self.rng.choice(SORTS)}")
+        experiences = body['experiences'] if body else []
+        return self.rng.choice(experiences)['id'] if experiences else None
+
+    def typeahead(self):
+        word = self.rng.choice(ACTIVITIES + [city.split(',')[0] for city in CITIES])
+        for end in range(1, min(len(word), 6) + 1):
+            self.call('typeahead: suggest', 'GET', f"/search/suggest?q={urllib.request.quote(word[:end])}")
+        self.call('typeahead: search', 'GET', f"/search?q={urllib.request.quote(word)}")
+
+    def browse(self):
+        first_page = f"/experiences/?profile=card&sort={self.rng.choice(SORTS)}"
+        path = first_page
+        experiences = []
+        for _ in range(self.rng.randint(1, 3)):
+            _, body = self.call('browse: list', 'GET', path)
+            if not body:
+                return
+            experiences = body['experiences'] or experiences
+            if not body['next_cursor']:
+                break
+            path = f"{first_page}&cursor={body['next_cursor']}"
+        if not experiences:
+            return
+        experience_id = self.rng.choice(experiences)['id']
+        self.call('browse: experience', 'GET', f"/experiences/{experience_id}")
+        self.call('browse: reviews', 'GET', f"/reviews/?experience_id={experience_id}")
+        self.call('browse: availability', 'GET', f"/experiences/{experience_id}/availability")
+
+    def checkout(self):
+        experience_id = self.pick_experience()
+        if experience_id is None:
+            return
+        start = date.today() + timedelta(days=1)
+        _, body = self.call(
+            'checkout: availability', 'GET',
+            f"/experiences/{experience_id}/availability?from={start}&to={start + timedelta(days=30)}",
+            ok=(200, 404)
+        )
+        guests = self.rng.choice([1, 2, 2, 4])
+        slots = [slot for slot in (body or {}).get('slots', []) if slot['available'] is None or slot['available'] >= guests]
+        if not slots:
+            return
+        slot = self.rng.choice(slots)
+        starts_at = f"{slot['date']}T{slot['start_time'] or '19:00:00'}"
+        status, booking = self.call('checkout: book', 'POST', '/bookings/', {
+            'experience_id': experience_id,
+            'number_of_guests': guests,
+            'payment_method_id': self.user_id,
+            'reservations': [{'date': starts_at, 'time_slot': starts_at}]
+        }, ok=(201, 409))
+        if status == 201:
+            self.call('checkout: confirmation', 'GET', f"/bookings/{booking['id']}")
+
+    def my_bookings(self):
+        self.call('my_bookings: current', 'GET', '/bookings/?scope=current')
+        self.call('my_bookings: past', 'GET', '/bookings/?scope=past')
+        self.call('my_bookings: payment methods', 'GET', '/payment_methods/')
+        self.call('my_bookings: payments', 'GET', '/payments/')
+
+    def run(self, scenarios, weights, deadline):
+        while time.monotonic() < deadline:
+            getattr(self, self.rng.choices(scenarios, weights=weights)[0])()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def summarize(users, elapsed):
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    for user in users:
+        for step, values in user.samples.items():
+            if step != 'login':
+                samples[step].extend(values)
+        for step, count in user.errors.items():
+            errors[step] += count
+
+    steps = {}
+    for step in sorted(samples):
+        values = sorted(samples[step])
+        steps[step] = {
+            'count': len(values),
+            'errors': errors.get(step, 0),
+            'throughput': len(values) / elapsed,
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000
+        }
+    total = sum(step['count'] for step in steps.values())
+    return {
+        'elapsed_seconds': elapsed,
+        'requests': total,
+        'errors': sum(step['errors'] for step in steps.values()),
+        'throughput': total / elapsed,
+        'steps': steps
+    }
+
+def print_report(results):
+    print(f"{'step':32} {'count':>8} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for step, stats in results['steps'].items():
+        print(f"{step:32} {stats['count']:>8} {stats['errors']:>7} {stats['throughput']:>8.1f} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+    print(f"{results['requests']} requests, {results['errors']} errors in {results['elapsed_seconds']:.1f}s "
+          f"({results['throughput']:.1f} req/s)")
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for step, stats in results['steps'].items():
+        before = baseline['steps'].get(step)
+        if before and stats['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            found.append(f"{step}: p95 {before['p95_ms']:.1f}ms -> {stats['p95_ms']:.1f}ms")
+    if results['throughput'] < baseline['throughput'] * (1 - tolerance):
+        found.append(f"throughput {baseline['throughput']:.1f} -> {results['throughput']:.1f} req/s")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', nargs='+', choices=SCENARIO_WEIGHTS, default=list(SCENARIO_WEIGHTS))
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run after logging in')
+    parser.add_argument('--concurrency', type=int, default=8, help='virtual users, one thread each')
+    parser.add_argument('--users', type=int, default=1000, help='synthetic users to log in as, from loadtest1')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--url', help='base URL of a running server; defaults to the app in this process')
+    parser.add_argument('--database-url', help='for the in-process app; defaults to the DB_* environment')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file written by --save')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+    else:
+        if args.database_url:
+            config.Config.SQLALCHEMY_DATABASE_URI = args.database_url
+        # Imported after the database URL is set, since importing extensions reads it
+        from app import app
+        make_client = lambda: AppClient(app)
+
+    rng = random.Random(args.seed)
+    users = [
+        VirtualUser(make_client(), rng.randint(1, args.users), seed=args.seed + n)
+        for n in range(args.concurrency)
+    ]
+    for user in users:
+        user.login()
+
+    weights = [SCENARIO_WEIGHTS[name] for name in args.scenario]
+    deadline = time.monotonic() + args.duration
+    threads = [threading.Thread(target=user.run, args=(args.scenario, weights, deadline)) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    results = summarize(users, time.perf_counter() - started)
+    results['config'] = {'scenarios': args.scenario, 'concurrency': args.concurrency, 'url': args.url}
+    print_report(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if found else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Login throughput against the password pool at several pool sizes.
+
+Each simulated request thread verifies a password the way /api/login does,
+so the numbers show how many logins a second one app process can take with
+the configured argon2 cost before its queue starts rejecting work.
+
+    python benchmarks/login_throughput.py --sizes 1 2 4 8 --requests 200
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from passwords import PasswordPool, PasswordPoolBusy, hash_task
+
+def run(workers, requests, concurrency, params, password_hash):
+    pool = PasswordPool(workers=workers, max_pending=concurrency, timeout=60, params=params)
+    # Start the worker processes before timing
+    pool.verify(password_hash, 'benchmark-password')
+
+    latencies = []
+    def login(_):
+        started = time.perf_counter()
+        try:
+            pool.verify(password_hash, 'benchmark-password')
+        except PasswordPoolBusy:
+            return
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        list(threads.map(login, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    stats = pool.stats()
+    pool.shutdown()
+    latencies.sort()
+    return {
+        'throughput': len(latencies) / elapsed,
+        'p50': latencies[len(latencies) // 2] if latencies else 0.0,
+        'p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        'peak_pending': stats['peak_pending'],
+        'rejected': stats['rejected']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 4])
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    params = (Config.ARGON2_TIME_COST, Config.ARGON2_MEMORY_COST, Config.ARGON2_PARALLELISM)
+    password_hash = hash_task('benchmark-password', params)
+    print(f"argon2 time_cost={params[0]} memory_cost={params[1]} parallelism={params[2]}, "
+          f"{args.requests} logins from {args.concurrency} threads")
+    print(f"{'workers':>8} {'logins/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'peak queue':>11} {'rejected':>9}")
+
+    for workers in args.sizes:
+        result = run(workers, args.requests, args.concurrency, params, password_hash)
+        print(f"{workers:>8} {result['throughput']:>10.1f} {result['p50'] * 1000:>8.1f} "
+              f"{result['p95'] * 1000:>8.1f} {result['peak_pending']:>11} {result['rejected']:>9}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+"""Fill the database with a synthetic catalog at load-test scale.
+
+Popularity is long-tailed: a few experiences and users account for most
+reviews and bookings (Zipf-like weights), ratings lean positive, prices are
+log-normal and booking dates cluster around today. Runs are deterministic for
+a given --seed, so baselines taken on the same scale compare like for like.
+
+Every user's password is LOAD_TEST_PASSWORD and user 1 is an admin.
+Existing tables are dropped first, as seed.py does, so the script only runs
+against a separate --database-url, or against the app's own database (the
+DB_* environment) with --reset. Rows are streamed in through bulk_load (COPY
+on PostgreSQL).
+
+    python benchmarks/synthetic_data.py --scale small --reset
+    python benchmarks/synthetic_data.py --scale large --database-url postgresql://speakeasy@localhost/speakeasy_load
+    python benchmarks/synthetic_data.py --experiences 5000 --reviews 200000 --database-url sqlite:////tmp/load.db
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, time as clock, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from sqlalchemy import make_url, text
+
+LOAD_TEST_PASSWORD = 'loadtest-password'
+
+SCALES = {
+    'small': {'users': 2000, 'experiences': 1000, 'reviews': 50000, 'bookings': 10000},
+    'medium': {'users': 20000, 'experiences': 10000, 'reviews': 1000000, 'bookings': 100000},
+    'large': {'users': 200000, 'experiences': 100000, 'reviews': 10000000, 'bookings': 1000000},
+}
+
+FIRST_NAMES = ['Ada', 'Bea', 'Cal', 'Dev', 'Eli', 'Fay', 'Gus', 'Hal', 'Ivy', 'Jo', 'Kai', 'Lou', 'Mia', 'Ned', 'Oz', 'Pia']
+LAST_NAMES = ['Ruby', 'Sapphire', 'Emerald', 'Topaz', 'Onyx', 'Opal', 'Garnet', 'Jade', 'Pearl', 'Quartz', 'Amber', 'Beryl']
+CITIES = [
+    'New York, NY', 'Los Angeles, CA', 'Chicago, IL', 'Miami, FL', 'Austin, TX', 'Seattle, WA', 'Denver, CO',
+    'New Orleans, LA', 'Paris, France', 'London, UK', 'Tokyo, Japan', 'Reykjavik, Iceland', 'Cape Town, South Africa',
+    'Sydney, Australia', 'Rio de Janeiro, Brazil', 'Kyoto, Japan', 'Marrakesh, Morocco', 'Lisbon, Portugal'
+]
+ADJECTIVES = ['Private', 'Midnight', 'Hidden', 'Secret', 'Exclusive', 'Candlelit', 'Rooftop', 'Underground', 'Sunset', 'Vintage']
+ACTIVITIES = [
+    'Jazz Session', 'Wine Tasting', 'Cocktail Masterclass', 'Chef\'s Table', 'Gallery Tour', 'Speakeasy Crawl',
+    'Whisky Flight', 'Glacier Hike', 'Hot Air Balloon Ride', 'Submarine Dive', 'Opera Box', 'Distillery Visit'
+]
+TAGS = [
+    'Exclusive Access', 'Once in a Lifetime', 'Adventure', 'Luxury', 'Educational', 'Cultural', 'Nightlife',
+    'Food & Drink', 'Music', 'Outdoors', 'Romantic', 'Wellness', 'Art', 'History', 'Family', 'Small Group'
+]
+REVIEW_PHRASES = [
+    'One of the best nights of my life.', 'Worth every penny.', 'The host was fantastic.', 'A bit overpriced.',
+    'Hard to find, which was half the fun.', 'Would book again.', 'Not what I expected.', 'Unforgettable views.',
+    'The drinks were incredible.', 'Too crowded for my taste.', 'Perfect for a date.', 'Booked it twice already.'
+]
+# Probability of 1..5 stars
+RATING_WEIGHTS = [0.03, 0.05, 0.12, 0.30, 0.50]
+GUEST_WEIGHTS = [0.25, 0.40, 0.12, 0.12, 0.04, 0.04, 0.02, 0.01]
+BOOKING_STATUSES = (['confirmed', 'pending', 'cancelled'], [0.75, 0.15, 0.10])
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def zipf_cum_weights(count, exponent=1.07):
+    # Weight of the item at rank r is 1/r^exponent; ranks are shuffled ids
+    total = 0.0
+    cum = []
+    for rank in range(1, count + 1):
+        total += 1 / rank ** exponent
+        cum.append(total)
+    return cum
+
+
+class SyntheticCatalog:
+    """Row generators for each table, in insert order. Rows are dicts with
+    explicit ids so foreign keys are known without reading anything back."""
+
+    def __init__(self, counts, seed=42):
+        self.counts = counts
+        self.rng = random.Random(seed)
+        self.now = datetime.now().replace(microsecond=0)
+        self.today = self.now.date()
+
+        self.experience_ids = list(range(1, counts['experiences'] + 1))
+        self.rng.shuffle(self.experience_ids)
+        self.experience_weights = zipf_cum_weights(counts['experiences'])
+        self.user_ids = list(range(1, counts['users'] + 1))
+        self.rng.shuffle(self.user_ids)
+        self.user_weights = zipf_cum_weights(counts['users'], exponent=0.8)
+
+        # Drawn up front because bookings and payments read them, and tables
+        # are loaded in foreign key order rather than the order listed below
+        upfront = random.Random(seed + 1)
+        self.prices = {
+            experience_id: round(min(max(upfront.lognormvariate(math.log(250), 1.0), 20), 50000), 2)
+            for experience_id in range(1, counts['experiences'] + 1)
+        }
+        # Weekdays of weekly schedules, None for daily ones
+        self.schedules = {
+            experience_id: sorted(upfront.sample(range(7), upfront.randint(1, 3))) if upfront.random() < 0.4 else None
+            for experience_id in range(1, counts['experiences'] + 1)
+        }
+
+    def pick_experiences(self, k):
+        return self.rng.choices(self.experience_ids, cum_weights=self.experience_weights, k=k)
+
+    def pick_users(self, k):
+        return self.rng.choices(self.user_ids, cum_weights=self.user_weights, k=k)
+
+    def tables(self, password_hash):
+        from models import (
+            Booking, Bundle, Experience, ExperienceImage, ExperienceSchedule, Payment, PaymentMethod,
+            Reservation, Review, Tag, User, bundle_experience, experience_tag
+        )
+        return [
+            (User.__table__, self.users(password_hash)),
+            (PaymentMethod.__table__, self.payment_methods()),
+            (Tag.__table__, self.tags()),
+            (Experience.__table__, self.experiences()),
+            (ExperienceImage.__table__, self.experience_images()),
+            (ExperienceSchedule.__table__, self.experience_schedules()),
+            (experience_tag, self.experience_tags()),
+            (Bundle.__table__, self.bundles()),
+            (bundle_experience, self.bundle_experiences()),
+            (Review.__table__, self.reviews()),
+            (Booking.__table__, self.bookings()),
+            (Reservation.__table__, self.reservations()),
+            (Payment.__table__, self.payments()),
+        ]
+
+    def users(self, password_hash):
+        for user_id in range(1, self.counts['users'] + 1):
+            yield {
+                'id': user_id,
+                'first_name': self.rng.choice(FIRST_NAMES),
+                'last_name': self.rng.choice(LAST_NAMES),
+                'email': f"loadtest{user_id}@example.com",
+                'password_hash': password_hash,
+                'created_at': self.now - timedelta(days=self.rng.randint(0, 1500)),
+                'last_login': None,
+                'phone_number': f"555{user_id:07d}"[-10:],
+                'admin': user_id == 1
+            }
+
+    def payment_methods(self):
+        # One card per user, so user n pays with payment method n, and a
+        # second hidden one for a fifth of them
+        for user_id in range(1, self.counts['users'] + 1):
+            yield self.card(user_id, user_id, hidden=False)
+        extra_id = self.counts['users']
+        for user_id in range(1, self.counts['users'] + 1, 5):
+            extra_id += 1
+            yield self.card(extra_id, user_id, hidden=True)
+
+    def card(self, card_id, user_id, hidden):
+        return {
+            'id': card_id,
+            'user_id': user_id,
+            'card_number': f"4{self.rng.randrange(10 ** 15):015d}",
+            'cvv': f"{self.rng.randrange(1000):03d}",
+            'billing_zip': f"{self.rng.randrange(100000):05d}",
+            'exp_month': self.rng.randint(1, 12),
+            'exp_year': self.today.year + self.rng.randint(0, 5),
+            'hidden': hidden,
+            'version': 1
+        }
+
+    def tags(self):
+        for tag_id, name in enumerate(TAGS, start=1):
+            yield {'id': tag_id, 'name': name, 'description': f"{name} experiences"}
+
+    def experiences(self):
+        for experience_id in range(1, self.counts['experiences'] + 1):
+            city = self.rng.choice(CITIES)
+            activity = self.rng.choice(ACTIVITIES)
+            price = self.prices[experience_id]
+            yield {
+                'id': experience_id,
+                'title': f"{self.rng.choice(ADJECTIVES)} {activity} in {city.split(',')[0]}"[:100],
+                'description': f"{activity} hosted by locals in {city}. " + ' '.join(self.rng.sample(REVIEW_PHRASES, 3)),
+                'location': city,
+                'price': price,
+                'review_count': 0,
+                'rating_sum': 0,
+                'average_rating': None,
+                'version': 1
+            }
+
+    def experience_images(self):
+        image_id = 0
+        for experience_id in range(1, self.counts['experiences'] + 1):
+            for n in range(self.rng.randint(1, 5)):
+                image_id += 1
+                yield {
+                    'id': image_id,
+                    'experience_id': experience_id,
+                    'image_url': f"https://images.example.com/experiences/{experience_id}/{n}.jpg"
+                }
+
+    def experience_schedules(self):
+        for experience_id in range(1, self.counts['experiences'] + 1):
+            days = self.schedules[experience_id]
+            weekly = days is not None
+            start_hour = self.rng.choice([10, 14, 18, 19, 20, 21])
+            yield {
+                'id': experience_id,
+                'experience_id': experience_id,
+                'start_date': self.today - timedelta(days=400),
+                'end_date': self.today + timedelta(days=400),
+                'recurring_pattern': 'Weekly' if weekly else 'Daily',
+                'days_of_week': ','.join(WEEKDAYS[day] for day in days) if weekly else None,
+                'start_time': clock(start_hour, 0),
+                'end_time': clock(min(start_hour + 3, 23), 0),
+                'capacity': self.rng.choice([8, 12, 20, 40, 100])
+            }
+
+    def experience_tags(self):
+        for experience_id in range(1, self.counts['experiences'] + 1):
+            for tag_id in self.rng.sample(range(1, len(TAGS) + 1), self.rng.randint(1, 3)):
+                yield {'tag_id': tag_id, 'experience_id': experience_id}
+
+    def bundles(self):
+        for bundle_id in range(1, self.counts['experiences'] // 100 + 1):
+            yield {
+                'id': bundle_id,
+                'name': f"Bundle {bundle_id}",
+                'description': 'A curated set of experiences',
+                'total_price': round(self.rng.uniform(500, 20000), 2)
+            }
+
+    def bundle_experiences(self):
+        for bundle_id in range(1, self.counts['experiences'] // 100 + 1):
+            for experience_id in set(self.pick_experiences(self.rng.randint(3, 5))):
+                yield {'bundle_id': bundle_id, 'experience_id': experience_id}
+
+    def reviews(self, batch=10000):
+        review_id = 0
+        ratings = range(1, 6)
+        while review_id < self.counts['reviews']:
+            k = min(batch, self.counts['reviews'] - review_id)
+            experience_ids = self.pick_experiences(k)
+            user_ids = self.pick_users(k)
+            stars = self.rng.choices(ratings, weights=RATING_WEIGHTS, k=k)
+            for experience_id, user_id, rating in zip(experience_ids, user_ids, stars):
+                review_id += 1
+                yield {
+                    'id': review_id,
+                    'user_id': user_id,
+                    'experience_id': experience_id,
+                    'rating': rating,
+                    'comment': self.rng.choice(REVIEW_PHRASES),
+                    'timestamp': self.now - timedelta(minutes=self.rng.randrange(3 * 365 * 24 * 60))
+                }
+
+    def booking_date(self, experience_id):
+        # Mostly recent past, a third upcoming, moved onto a scheduled weekday
+        day = self.today + timedelta(days=int(self.rng.triangular(-365, 180, 0)))
+        days = self.schedules.get(experience_id)
+        if days:
+            while day.weekday() not in days:
+                day += timedelta(days=1)
+        return day
+
+    def bookings(self, batch=10000):
+        # Remembered for reservations and payments
+        self.booking_rows = {}
+        booking_id = 0
+        statuses, status_weights = BOOKING_STATUSES
+        while booking_id < self.counts['bookings']:
+            k = min(batch, self.counts['bookings'] - booking_id)
+            experience_ids = self.pick_experiences(k)
+            user_ids = self.pick_users(k)
+            guests = self.rng.choices(range(1, len(GUEST_WEIGHTS) + 1), weights=GUEST_WEIGHTS, k=k)
+            booking_statuses = self.rng.choices(statuses, weights=status_weights, k=k)
+            for experience_id, user_id, guest_count, status in zip(experience_ids, user_ids, guests, booking_statuses):
+                booking_id += 1
+                first_date = self.booking_date(experience_id)
+                self.booking_rows[booking_id] = (experience_id, user_id, guest_count, status, first_date)
+                yield {
+                    'id': booking_id,
+                    'user_id': user_id,
+                    'experience_id': experience_id,
+                    'number_of_guests': guest_count,
+                    'confirmation_code': f"LT{booking_id:010d}",
+                    'bundle_id': None,
+                    'status': status,
+                    'created_at': datetime.combine(first_date, clock(12)) - timedelta(days=self.rng.randint(1, 60)),
+                    'version': 1
+                }
+
+    def reservations(self):
+        reservation_id = 0
+        for booking_id, (experience_id, user_id, guests, status, first_date) in self.booking_rows.items():
+            days = self.schedules.get(experience_id)
+            step = 7 if days else 1
+            for n in range(self.rng.choices([1, 2, 3], weights=[0.8, 0.15, 0.05])[0]):
+                reservation_id += 1
+                yield {
+                    'id': reservation_id,
+                    'booking_id': booking_id,
+                    'date': first_date + timedelta(days=n * step),
+                    'time_slot': clock(self.rng.choice([10, 14, 18, 19, 20, 21]), 0),
+                    'status': status,
+                    'created_at': self.now
+                }
+
+    def payments(self):
+        payment_id = 0
+        for booking_id, (experience_id, user_id, guests, status, first_date) in self.booking_rows.items():
+            if status == 'cancelled':
+                continue
+            payment_id += 1
+            yield {
+                'id': payment_id,
+                'booking_id': booking_id,
+                'user_id': user_id,
+                'amount': round(self.prices[experience_id] * guests, 2),
+                'payment_method_id': user_id,
+                'status': 'Confirmed'
+            }
+
+
+def load(catalog, batch_size=5000):
+    """Bulk load the catalog into the app's (empty) tables and fill in the
+    experiences' rating aggregates. Returns bulk_load's timings."""
+    from bulk_load import bulk_load
+    from extensions import db
+    from models import Experience
+    from passwords import hash_task
+
+    params = (config.Config.ARGON2_TIME_COST, config.Config.ARGON2_MEMORY_COST, config.Config.ARGON2_PARALLELISM)
+    timings = bulk_load(db.session, catalog.tables(hash_task(LOAD_TEST_PASSWORD, params)), batch_size=batch_size)
+    Experience.refresh_rating_aggregates()
+    db.session.commit()
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    for name in SCALES['small']:
+        parser.add_argument(f"--{name}", type=int, help=f"override the scale's {name} count")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=5000, help='executemany batch size where COPY is unavailable')
+    parser.add_argument('--database-url', help='a separate database to load; defaults to the DB_* environment the app uses')
+    parser.add_argument('--reset', action='store_true', help="drop and reload the app's own database")
+    args = parser.parse_args()
+
+    app_url = make_url(config.Config.SQLALCHEMY_DATABASE_URI)
+    separate = args.database_url and make_url(args.database_url) != app_url
+    if not (separate or args.reset):
+        parser.error(
+            f"this drops every table in {app_url.render_as_string(hide_password=True)}; "
+            "pass --reset to replace it, or --database-url to load a separate database"
+        )
+
+    counts = dict(SCALES[args.scale])
+    for name in counts:
+        if getattr(args, name) is not None:
+            counts[name] = getattr(args, name)
+
+    if args.database_url:
+        config.Config.SQLALCHEMY_DATABASE_URI = args.database_url
+
+    # Imported after the database URL is set, since importing extensions reads it
+    from app import app
+    from extensions import db
+    from flask_migrate import upgrade
+
+    catalog = SyntheticCatalog(counts, seed=args.seed)
+
+    with app.app_context():
+        db.drop_all()
+        db.session.execute(text('DROP TABLE IF EXISTS alembic_version'))
+        db.session.commit()
+        db.create_all()
+
+        started = time.perf_counter()
+        timings = load(catalog, batch_size=args.batch_size)
+        for name, count, elapsed in timings:
+            print(f"{name:20} {count:>10} rows  {elapsed:8.1f}s  {count / max(elapsed, 1e-9):>10.0f} rows/s")
+
+        upgrade()
+        print(f"Loaded in {time.perf_counter() - started:.1f}s")
+
+if __name__ == '__main__':
+    main()
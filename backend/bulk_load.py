@@ -0,0 +1,210 @@
+import time
+from datetime import date, datetime, time as clock
+from itertools import chain, islice
+from sqlalchemy import Date, DateTime, Time, inspect, insert
+
+# COPY's text format: tab-separated, \N for NULL, backslash escapes
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+COPY_READ_SIZE = 1 << 20
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    return str(value).translate(COPY_ESCAPES)
+
+
+class CopyStream:
+    """File-like view of rows in COPY text format. psycopg2 reads it in
+    chunks, so a table is streamed without being held in memory."""
+
+    def __init__(self, rows, columns):
+        self.lines = ('\t'.join([copy_value(row.get(column)) for column in columns]) + '\n' for row in rows)
+        self.rest = ''
+        self.count = 0
+
+    def read(self, size=COPY_READ_SIZE):
+        parts = [self.rest]
+        length = len(self.rest)
+        while size < 0 or length < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            parts.append(line)
+            length += len(line)
+            self.count += 1
+        data = ''.join(parts)
+        if size < 0:
+            self.rest = ''
+            return data
+        self.rest = data[size:]
+        return data[:size]
+
+
+def object_rows(objects):
+    """Rows for ORM objects that were never flushed. Missing ids are numbered
+    by position, as a fresh table would, and Python-side column defaults
+    are filled in."""
+    for position, obj in enumerate(objects, start=1):
+        row = {}
+        for column in obj.__table__.columns:
+            value = getattr(obj, column.key, None)
+            if value is None and column.primary_key:
+                value = position
+            elif value is None and column.default is not None:
+                value = column.default.arg(None) if column.default.is_callable else column.default.arg
+            row[column.name] = value
+        yield row
+
+
+def sqlite_processor(column, dialect):
+    # The column type's bind processor, which turns dates and Decimals into
+    # what sqlite3 takes. seed_data writes dates and times as ISO strings,
+    # so those are parsed first.
+    processor = column.type.dialect_impl(dialect).bind_processor(dialect)
+    parse = next((
+        python_type.fromisoformat
+        for sql_type, python_type in ((DateTime, datetime), (Date, date), (Time, clock))
+        if isinstance(column.type, sql_type)
+    ), None)
+
+    def process(value):
+        if parse and isinstance(value, str):
+            value = parse(value)
+        return processor(value) if processor else value
+    return process
+
+
+def copy_rows(connection, table, rows, columns):
+    preparer = connection.dialect.identifier_preparer
+    stream = CopyStream(rows, columns)
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {preparer.format_table(table)} ({', '.join(preparer.quote(c) for c in columns)}) FROM STDIN",
+            stream,
+            size=COPY_READ_SIZE
+        )
+    return stream.count
+
+
+def insert_rows(connection, table, rows, columns, batch_size):
+    count = 0
+    if connection.dialect.name == 'sqlite':
+        # Straight to the driver's executemany, skipping statement
+        # compilation for every batch
+        preparer = connection.dialect.identifier_preparer
+        processors = [sqlite_processor(table.c[column], connection.dialect) for column in columns]
+        sql = (
+            f"INSERT INTO {preparer.format_table(table)} ({', '.join(preparer.quote(c) for c in columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+        while True:
+            chunk = [
+                tuple(process(row.get(column)) for process, column in zip(processors, columns))
+                for row in islice(rows, batch_size)
+            ]
+            if not chunk:
+                return count
+            connection.exec_driver_sql(sql, chunk)
+            count += len(chunk)
+
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            return count
+        connection.execute(insert(table), chunk)
+        count += len(chunk)
+
+
+def drop_foreign_keys(connection, tables):
+    preparer = connection.dialect.identifier_preparer
+    inspector = inspect(connection)
+    dropped = []
+    for table in tables:
+        for foreign_key in inspector.get_foreign_keys(table.name):
+            connection.exec_driver_sql(
+                f"ALTER TABLE {preparer.format_table(table)} DROP CONSTRAINT {preparer.quote(foreign_key['name'])}"
+            )
+            dropped.append((table, foreign_key))
+    return dropped
+
+
+def restore_foreign_keys(connection, dropped):
+    # Each constraint is validated with one scan of its table instead of a
+    # lookup per inserted row
+    preparer = connection.dialect.identifier_preparer
+    for table, foreign_key in dropped:
+        options = foreign_key.get('options', {})
+        actions = ''.join(f" ON {action.upper()} {options[action].upper()}" for action in ('ondelete', 'onupdate') if options.get(action))
+        connection.exec_driver_sql(
+            f"ALTER TABLE {preparer.format_table(table)} ADD CONSTRAINT {preparer.quote(foreign_key['name'])} "
+            f"FOREIGN KEY ({', '.join(preparer.quote(c) for c in foreign_key['constrained_columns'])}) "
+            f"REFERENCES {preparer.quote(foreign_key['referred_table'])} "
+            f"({', '.join(preparer.quote(c) for c in foreign_key['referred_columns'])}){actions}"
+        )
+
+
+def reset_sequences(connection, tables):
+    # Rows came in with explicit ids, so move each serial past the largest
+    for table in tables:
+        if 'id' in table.c and table.c.id.primary_key:
+            connection.exec_driver_sql(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), coalesce(max(id), 1), max(id) IS NOT NULL) "
+                f"FROM {connection.dialect.identifier_preparer.format_table(table)}"
+            )
+
+
+def bulk_load(session, tables, batch_size=5000, defer_constraints=True):
+    """Load (table, rows) pairs, rows being iterables of dicts keyed by column
+    name, in one transaction. Tables go in foreign key dependency order.
+
+    On PostgreSQL (psycopg2) rows are streamed through COPY FROM STDIN. With
+    defer_constraints the tables' foreign keys and indexes are dropped for the
+    load and rebuilt once at the end, then the tables are analyzed. Elsewhere
+    rows go in as multi-row executemany batches of batch_size, with SQLite's
+    foreign key checks deferred to commit.
+
+    Returns (table name, rows, seconds) for each table."""
+    connection = session.connection()
+    dialect = connection.dialect
+    use_copy = dialect.name == 'postgresql' and dialect.driver == 'psycopg2'
+
+    order = {table: position for position, table in enumerate(tables[0][0].metadata.sorted_tables)} if tables else {}
+    tables = sorted(tables, key=lambda pair: order.get(pair[0], len(order)))
+    loaded_tables = [table for table, _ in tables]
+
+    dropped_keys, dropped_indexes = [], []
+    if dialect.name == 'postgresql' and defer_constraints:
+        dropped_keys = drop_foreign_keys(connection, loaded_tables)
+        for table in loaded_tables:
+            for index in table.indexes:
+                index.drop(connection, checkfirst=True)
+                dropped_indexes.append(index)
+    elif dialect.name == 'sqlite':
+        connection.exec_driver_sql('PRAGMA defer_foreign_keys = ON')
+
+    timings = []
+    for table, rows in tables:
+        started = time.perf_counter()
+        rows = iter(rows)
+        first = next(rows, None)
+        count = 0
+        if first is not None:
+            columns = list(first)
+            rows = chain([first], rows)
+            if use_copy:
+                count = copy_rows(connection, table, rows, columns)
+            else:
+                count = insert_rows(connection, table, rows, columns, batch_size)
+        timings.append((table.name, count, time.perf_counter() - started))
+
+    if dialect.name == 'postgresql':
+        for index in dropped_indexes:
+            index.create(connection)
+        restore_foreign_keys(connection, dropped_keys)
+        reset_sequences(connection, loaded_tables)
+        # Fresh statistics, so the planner doesn't treat the tables as empty
+        for table in loaded_tables:
+            connection.exec_driver_sql(f"ANALYZE {dialect.identifier_preparer.format_table(table)}")
+    session.commit()
+    return timings
@@ -0,0 +1,49 @@
+import random
+import time
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+
+# Blueprints whose GET routes only read and can tolerate replica lag
+READ_BLUEPRINTS = {'experiences', 'tags', 'reviews', 'search', 'images', 'schedules'}
+
+# Set on responses to writes; while it's fresh the client's reads go to the
+# primary so they see their own change even if the replicas lag
+PRIMARY_COOKIE = 'read_primary_until'
+
+def replica_keys():
+    return [key for key in current_app.config.get('SQLALCHEMY_BINDS', {}) if key.startswith('replica_')]
+
+def use_replica():
+    if not has_request_context():
+        return False
+    if 'use_replica' not in g:
+        g.use_replica = (
+            request.method in ('GET', 'HEAD')
+            and request.blueprint in READ_BLUEPRINTS
+            and request.cookies.get(PRIMARY_COOKIE, type=float, default=0) < time.time()
+            and bool(replica_keys())
+        )
+    return g.use_replica
+
+def stick_to_primary(response):
+    # after_request hook: any successful write pins the client to the primary
+    # for DB_REPLICA_STICKY_SECONDS
+    if request.method in ('GET', 'HEAD', 'OPTIONS') or response.status_code >= 400 or not replica_keys():
+        return response
+
+    seconds = current_app.config['DB_REPLICA_STICKY_SECONDS']
+    response.set_cookie(PRIMARY_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True, samesite='Lax')
+    return response
+
+
+class RoutingSession(Session):
+    """Sends reads from the read-only blueprints' GET routes to a random
+    replica and everything else, including anything flushed, to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and use_replica():
+            if 'replica_key' not in g:
+                # One replica per request so its reads see a single snapshot
+                g.replica_key = random.choice(replica_keys())
+            return self._db.engines[g.replica_key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
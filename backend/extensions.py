@@ -1,8 +1,12 @@
 from flask import Flask, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
 from config import Config
+from db_routing import RoutingSession, stick_to_primary
+from query_stats import finish_request_stats, start_request_stats, stop_request_stats
+from metrics import record_request_metrics, start_request_metrics, stop_request_metrics
 from flask_cors import CORS
 import os
 
@@ -10,7 +14,8 @@ app = Flask(__name__)
 CORS(app, supports_credentials=True, origins=["http://localhost:8081"])
 app.config.from_object(Config)
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+migrate = Migrate()
 
 @app.before_request
 def before_request():
@@ -22,6 +27,22 @@ def before_request():
         response.headers.add('Access-Control-Allow-Credentials', 'true') 
         return response
 
+app.after_request(stick_to_primary)
+
+# Development/CI: count each request's SQL statements and DB time into
+# X-Query-Count and X-Query-Time-Ms, and log statement shapes repeated often
+# enough to look like N+1 lazy loads
+if app.config['QUERY_STATS']:
+    app.before_request(start_request_stats)
+    app.after_request(finish_request_stats)
+    app.teardown_request(stop_request_stats)
+
+# Latency, in-flight, DB time, encode time and size per endpoint, served at /metrics
+if app.config['METRICS']:
+    app.before_request(start_request_metrics)
+    app.after_request(record_request_metrics)
+    app.teardown_request(stop_request_metrics)
+
 
 ###########################
 # Authentication
@@ -0,0 +1,72 @@
+import logging
+import time
+from datetime import date, time as clock
+from decimal import Decimal
+from flask import g, has_request_context
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+def encode_value(value):
+    # Column types the models hand over as they are: dates and times as ISO
+    # 8601 strings, Decimals (prices, ratings) as numbers
+    if isinstance(value, (date, clock)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def record_encode_time(started):
+    # Summed per request for the response encode metric
+    if has_request_context():
+        g.json_encode_seconds = g.get('json_encode_seconds', 0.0) + time.perf_counter() - started
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """Flask's json module provider, with ISO dates instead of HTTP dates."""
+
+    @staticmethod
+    def default(o):
+        try:
+            return encode_value(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
+
+    def response(self, *args, **kwargs):
+        started = time.perf_counter()
+        response = super().response(*args, **kwargs)
+        record_encode_time(started)
+        return response
+
+
+class OrjsonProvider(JSONProvider):
+    """orjson encodes datetimes, dates and times natively in C; only Decimals
+    go through encode_value. Responses are written straight from orjson's
+    bytes."""
+
+    def __init__(self, app):
+        import orjson
+        super().__init__(app)
+        self.orjson = orjson
+        self.options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return self.orjson.dumps(obj, default=encode_value, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        return self.orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        started = time.perf_counter()
+        obj = self._prepare_response_obj(args, kwargs)
+        body = self.orjson.dumps(obj, default=encode_value, option=self.options)
+        record_encode_time(started)
+        return self._app.response_class(body, mimetype='application/json')
+
+
+def init_json_provider(app):
+    if app.config['JSON_PROVIDER'] == 'orjson':
+        try:
+            app.json = OrjsonProvider(app)
+            return
+        except ImportError:
+            logging.warning("orjson isn't installed, falling back to the stdlib JSON provider")
+    app.json = StdlibJSONProvider(app)
@@ -0,0 +1,117 @@
+import os
+import time
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from query_stats import QueryStats, active_collectors, start_collecting
+
+# Request metrics in Prometheus format, labelled by Flask endpoint
+# ('experiences.get_experiences', 'bookings.create_booking', ...) rather than
+# path so ids in URLs don't multiply series. Under gunicorn, set
+# PROMETHEUS_MULTIPROC_DIR to an empty directory shared by the workers: each
+# worker then writes its samples to mmapped files without locking and
+# /metrics adds them up across workers.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+requests_total = Counter(
+    'speakeasy_http_requests_total', 'Requests handled', ['method', 'endpoint', 'status']
+)
+request_seconds = Histogram(
+    'speakeasy_http_request_duration_seconds', 'Time to build the response',
+    ['method', 'endpoint'], buckets=LATENCY_BUCKETS
+)
+requests_in_flight = Gauge(
+    'speakeasy_http_requests_in_flight', 'Requests being handled',
+    ['endpoint'], multiprocess_mode='livesum'
+)
+db_seconds = Histogram(
+    'speakeasy_http_request_db_seconds', 'Time spent in SQL statements per request',
+    ['endpoint'], buckets=LATENCY_BUCKETS
+)
+db_queries = Histogram(
+    'speakeasy_http_request_queries', 'SQL statements per request',
+    ['endpoint'], buckets=QUERY_BUCKETS
+)
+encode_seconds = Histogram(
+    'speakeasy_http_response_encode_seconds', 'Time spent encoding the JSON body',
+    ['endpoint'], buckets=LATENCY_BUCKETS
+)
+response_bytes = Histogram(
+    'speakeasy_http_response_size_bytes', 'Size of buffered response bodies',
+    ['endpoint'], buckets=SIZE_BUCKETS
+)
+
+# argon2 jobs in passwords.PasswordPool, updated as jobs start and finish
+password_jobs_pending = Gauge(
+    'speakeasy_password_jobs_pending', 'Password hash jobs queued or running',
+    multiprocess_mode='livesum'
+)
+password_jobs_peak = Gauge(
+    'speakeasy_password_jobs_peak_pending', 'Most password hash jobs pending at once since start',
+    multiprocess_mode='livemax'
+)
+password_jobs_total = Counter(
+    'speakeasy_password_jobs_total', 'Password hash jobs by outcome (completed, failed, rejected, timed_out)',
+    ['outcome']
+)
+password_job_seconds = Histogram(
+    'speakeasy_password_job_seconds', 'Time from submitting a password hash job to its end',
+    buckets=LATENCY_BUCKETS
+)
+
+
+def endpoint_label():
+    # Unmatched paths (404s, preflights) share one label
+    return request.endpoint or 'unmatched'
+
+def start_request_metrics():
+    if request.endpoint == 'metrics':
+        return
+    endpoint = endpoint_label()
+    g.metrics_started = time.perf_counter()
+    g.metrics_endpoint = endpoint
+    g.metrics_queries = QueryStats(track_shapes=False)
+    g.metrics_token = start_collecting(g.metrics_queries)
+    requests_in_flight.labels(endpoint).inc()
+
+def record_request_metrics(response):
+    started = g.get('metrics_started')
+    if started is None:
+        return response
+
+    endpoint = g.metrics_endpoint
+    request_seconds.labels(request.method, endpoint).observe(time.perf_counter() - started)
+    requests_total.labels(request.method, endpoint, str(response.status_code)).inc()
+    db_seconds.labels(endpoint).observe(g.metrics_queries.seconds)
+    db_queries.labels(endpoint).observe(g.metrics_queries.count)
+    encode_seconds.labels(endpoint).observe(g.get('json_encode_seconds', 0.0))
+    # Streamed bodies (NDJSON exports) have no length until they're sent
+    if not response.is_streamed and response.content_length is not None:
+        response_bytes.labels(endpoint).observe(response.content_length)
+    return response
+
+def stop_request_metrics(exception=None):
+    token = g.pop('metrics_token', None)
+    if token is None:
+        return
+    active_collectors.reset(token)
+    requests_in_flight.labels(g.metrics_endpoint).dec()
+
+
+def metrics_response():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
+def mark_worker_dead(pid):
+    # Call from gunicorn's child_exit hook so a dead worker's live gauges
+    # stop counting
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,35 @@
+"""add version columns for ETags
+
+Revision ID: 0fa89bb9e667
+Revises: e6936c9e53a9
+Create Date: 2026-10-18 22:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0fa89bb9e667'
+down_revision = 'e6936c9e53a9'
+branch_labels = None
+depends_on = None
+
+
+# Tables whose rows carry a change counter (row_versions.VERSIONED_MODELS)
+TABLES = ['payment_methods', 'experiences', 'bookings']
+
+
+def upgrade():
+    # The server default fills existing rows with 1, the version a new row
+    # starts at. Databases made with db.create_all already have the columns.
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        columns = {column['name'] for column in inspector.get_columns(table)}
+        if 'version' not in columns:
+            op.add_column(table, sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_column(table, 'version')
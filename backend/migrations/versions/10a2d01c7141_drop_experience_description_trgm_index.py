@@ -0,0 +1,34 @@
+"""drop the unused description trigram index
+
+Revision ID: 10a2d01c7141
+Revises: 2ca028dfd143
+Create Date: 2026-10-18 21:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '10a2d01c7141'
+down_revision = '2ca028dfd143'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Earlier versions of the search revision built it, but descriptions are
+    # only matched through search_vector, so it cost writes and nothing else
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_experiences_description_trgm', table_name='experiences',
+            if_exists=True, postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    # The search revision no longer creates it, so there is nothing to restore
+    pass
@@ -0,0 +1,63 @@
+"""add experience rating aggregates and listing sort indexes
+
+Revision ID: 2ca028dfd143
+Revises: 48e59545d3eb
+Create Date: 2026-10-18 21:25:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2ca028dfd143'
+down_revision = '48e59545d3eb'
+branch_labels = None
+depends_on = None
+
+
+def aggregate_columns():
+    return [
+        sa.Column('review_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('average_rating', sa.Numeric(3, 2), nullable=True),
+    ]
+
+# Keyset pagination of the listing orders by (sort key, id); kept in step
+# with Experience.__table_args__
+INDEXES = [
+    ('ix_experiences_title_id', ['title', 'id']),
+    ('ix_experiences_price_id', [sa.text('coalesce(price, 0)'), 'id']),
+    ('ix_experiences_rating_id', [sa.text('coalesce(average_rating, 0)'), 'id']),
+]
+
+# Same computation as Experience.refresh_rating_aggregates
+BACKFILL = """
+    UPDATE experiences SET
+        review_count = (SELECT count(reviews.id) FROM reviews WHERE reviews.experience_id = experiences.id),
+        rating_sum = (SELECT coalesce(sum(reviews.rating), 0) FROM reviews WHERE reviews.experience_id = experiences.id),
+        average_rating = (SELECT round(avg(reviews.rating), 2) FROM reviews WHERE reviews.experience_id = experiences.id)
+"""
+
+
+def upgrade():
+    # Databases made with db.create_all already have the columns, kept up to
+    # date by the review handlers, so only fresh columns are backfilled
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('experiences')}
+    added = [column for column in aggregate_columns() if column.name not in existing]
+    for column in added:
+        op.add_column('experiences', column)
+    if added:
+        op.execute(BACKFILL)
+
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(name, 'experiences', columns, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, columns in reversed(INDEXES):
+            op.drop_index(name, table_name='experiences', if_exists=True, postgresql_concurrently=True)
+    for column in reversed(aggregate_columns()):
+        op.drop_column('experiences', column.name)
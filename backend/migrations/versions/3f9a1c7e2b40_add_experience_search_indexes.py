@@ -0,0 +1,45 @@
+"""add experience full-text and trigram search indexes
+
+Revision ID: 3f9a1c7e2b40
+Revises: 
+Create Date: 2026-10-18 17:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c7e2b40'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Only the postgres search backend uses these; SQLite keeps the in-memory index
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute("""
+        ALTER TABLE experiences ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED
+    """)
+    op.create_index('ix_experiences_search_vector', 'experiences', ['search_vector'], postgresql_using='gin')
+    op.create_index(
+        'ix_experiences_title_trgm', 'experiences', ['title'],
+        postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_experiences_title_trgm', table_name='experiences')
+    op.drop_index('ix_experiences_search_vector', table_name='experiences')
+    op.drop_column('experiences', 'search_vector')
@@ -0,0 +1,32 @@
+"""add lower(location) index for the experience listing filter
+
+Revision ID: 48e59545d3eb
+Revises: 8b2d4e6f1a93
+Create Date: 2026-10-18 21:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '48e59545d3eb'
+down_revision = '8b2d4e6f1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Matches ix_experiences_location_lower in models.py; text_pattern_ops is
+    # what lets LIKE 'prefix%' use it under a non-C collation
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_experiences_location_lower', 'experiences',
+            [sa.text('lower(location) text_pattern_ops' if op.get_bind().dialect.name == 'postgresql' else 'lower(location)')],
+            if_not_exists=True, postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_experiences_location_lower', table_name='experiences', if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,34 @@
+"""add version columns to tags and users
+
+Revision ID: 5d7e1b2c9a40
+Revises: 0fa89bb9e667
+Create Date: 2026-10-18 23:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7e1b2c9a40'
+down_revision = '0fa89bb9e667'
+branch_labels = None
+depends_on = None
+
+
+# Tag and reviewer names are part of experience and booking responses, so
+# their ETags read these counters too
+TABLES = ['tags', 'users']
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        columns = {column['name'] for column in inspector.get_columns(table)}
+        if 'version' not in columns:
+            op.add_column(table, sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_column(table, 'version')
@@ -0,0 +1,48 @@
+"""add indexes for per-user and per-experience lookups
+
+Revision ID: 8b2d4e6f1a93
+Revises: 3f9a1c7e2b40
+Create Date: 2026-10-18 19:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2d4e6f1a93'
+down_revision = '3f9a1c7e2b40'
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns), matched to the queries the blueprints run and kept
+# in step with the indexes declared in models.py
+INDEXES = [
+    ('ix_bookings_user_id_id', 'bookings', ['user_id', 'id']),
+    ('ix_bookings_experience_id', 'bookings', ['experience_id']),
+    ('ix_reservations_booking_id_date', 'reservations', ['booking_id', 'date']),
+    ('ix_reviews_experience_id_id', 'reviews', ['experience_id', 'id']),
+    ('ix_reviews_user_id_id', 'reviews', ['user_id', 'id']),
+    ('ix_experience_images_experience_id', 'experience_images', ['experience_id']),
+    ('ix_experience_tags_tag_id_experience_id', 'experience_tags', ['tag_id', 'experience_id']),
+    ('ix_experience_tags_experience_id_tag_id', 'experience_tags', ['experience_id', 'tag_id']),
+    ('ix_bundle_experiences_bundle_id_experience_id', 'bundle_experiences', ['bundle_id', 'experience_id']),
+    ('ix_bundle_experiences_experience_id_bundle_id', 'bundle_experiences', ['experience_id', 'bundle_id']),
+    ('ix_payment_methods_user_id_hidden_id', 'payment_methods', ['user_id', 'hidden', 'id']),
+    ('ix_payments_user_id', 'payments', ['user_id']),
+]
+
+
+def upgrade():
+    # Built concurrently on Postgres so large tables stay writable meanwhile.
+    # Databases made with db.create_all already have them.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
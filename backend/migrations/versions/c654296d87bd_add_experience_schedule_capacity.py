@@ -0,0 +1,28 @@
+"""add experience_schedules.capacity
+
+Revision ID: c654296d87bd
+Revises: 10a2d01c7141
+Create Date: 2026-10-18 22:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c654296d87bd'
+down_revision = '10a2d01c7141'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nullable with no default: existing schedules stay unlimited. Databases
+    # made with db.create_all already have it.
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('experience_schedules')}
+    if 'capacity' not in columns:
+        op.add_column('experience_schedules', sa.Column('capacity', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('experience_schedules', 'capacity')
@@ -0,0 +1,27 @@
+"""add users.token_generation
+
+Revision ID: e6936c9e53a9
+Revises: 4615cba76719
+Create Date: 2026-10-18 22:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6936c9e53a9'
+down_revision = '4615cba76719'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing tokens carry no generation and read as 0, so they stay valid
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('users')}
+    if 'token_generation' not in columns:
+        op.add_column('users', sa.Column('token_generation', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('users', 'token_generation')
@@ -0,0 +1,147 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from threading import BoundedSemaphore, Lock
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from config import Config
+from metrics import password_job_seconds, password_jobs_peak, password_jobs_pending, password_jobs_total
+
+class PasswordPoolBusy(Exception):
+    """Too many hashes are already waiting for a worker."""
+
+
+# One hasher per cost setting, built inside the worker process
+hashers = {}
+
+def get_hasher(params):
+    if params not in hashers:
+        time_cost, memory_cost, parallelism = params
+        hashers[params] = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    return hashers[params]
+
+def hash_task(password, params):
+    return get_hasher(params).hash(password)
+
+def verify_task(password_hash, password, params):
+    # (matches, needs_rehash)
+    hasher = get_hasher(params)
+    try:
+        hasher.verify(password_hash, password)
+    except (InvalidHashError, VerificationError):
+        return False, False
+    return True, hasher.check_needs_rehash(password_hash)
+
+
+class PasswordPool:
+    """argon2 hashing and verification in a bounded process pool. A request
+    thread waits on its own job but never burns the worker's CPU, and once
+    max_pending jobs are queued new ones fail fast with PasswordPoolBusy.
+
+    A job holds its slot until it actually ends, even if the request waiting
+    on it timed out, so max_pending also bounds the work still running."""
+
+    def __init__(self, workers, max_pending, timeout, params):
+        self.workers = workers
+        self.timeout = timeout
+        self.params = params
+        self.slots = BoundedSemaphore(max_pending)
+        self.lock = Lock()
+        self.executor = None
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.busy_seconds = 0.0
+
+    def get_executor(self):
+        # Started on first use so app servers fork their workers before the
+        # pool's processes exist
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self.executor
+
+    def finish(self, started, failed):
+        seconds = time.perf_counter() - started
+        with self.lock:
+            self.pending -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+                self.busy_seconds += seconds
+            pending = self.pending
+        self.slots.release()
+        password_jobs_pending.set(pending)
+        password_jobs_total.labels('failed' if failed else 'completed').inc()
+        password_job_seconds.observe(seconds)
+
+    def run(self, task, *args):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            password_jobs_total.labels('rejected').inc()
+            raise PasswordPoolBusy()
+
+        with self.lock:
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+            pending, peak = self.pending, self.peak_pending
+        password_jobs_pending.set(pending)
+        password_jobs_peak.set(peak)
+
+        started = time.perf_counter()
+        try:
+            future = self.get_executor().submit(task, *args, self.params)
+        except Exception:
+            self.finish(started, failed=True)
+            raise
+        # The slot is given back when the job ends (or is cancelled before it
+        # starts), not when this thread stops waiting for it
+        future.add_done_callback(
+            lambda done: self.finish(started, failed=done.cancelled() or done.exception() is not None)
+        )
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            with self.lock:
+                self.timed_out += 1
+            password_jobs_total.labels('timed_out').inc()
+            raise PasswordPoolBusy()
+
+    def hash(self, password):
+        return self.run(hash_task, password)
+
+    def verify(self, password_hash, password):
+        return self.run(verify_task, password_hash, password)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'pending': self.pending,
+                'peak_pending': self.peak_pending,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'average_seconds': self.busy_seconds / self.completed if self.completed else 0.0
+            }
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+
+password_pool = PasswordPool(
+    workers=Config.PASSWORD_HASH_WORKERS,
+    max_pending=Config.PASSWORD_HASH_MAX_PENDING,
+    timeout=Config.PASSWORD_HASH_TIMEOUT,
+    params=(Config.ARGON2_TIME_COST, Config.ARGON2_MEMORY_COST, Config.ARGON2_PARALLELISM)
+)
@@ -0,0 +1,127 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# A statement shape run this many times in one request is reported as a
+# likely N+1 (a lazy load per row instead of one query for all of them)
+N_PLUS_ONE_THRESHOLD = 5
+
+# IN lists are expanded into one placeholder per value; collapse them so
+# "IN (?, ?)" and "IN (?, ?, ?)" count as the same shape
+IN_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+# Collectors recording the statements of the current request or block
+active_collectors = ContextVar('active_collectors', default=())
+
+
+def statement_shape(statement):
+    return IN_LIST.sub('(?)', WHITESPACE.sub(' ', statement).strip())
+
+
+class QueryStats:
+    """Statements run while it's active: how many, how long they took in total
+    and (with track_shapes) how often each shape repeated."""
+
+    def __init__(self, track_shapes=True):
+        self.count = 0
+        self.seconds = 0.0
+        self.track_shapes = track_shapes
+        self.shapes = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if self.track_shapes:
+            self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+def start_collecting(stats):
+    return active_collectors.set(active_collectors.get() + (stats,))
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    if active_collectors.get():
+        conn.info.setdefault('query_stats_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    collectors = active_collectors.get()
+    started = conn.info.get('query_stats_started')
+    if not collectors or not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    for stats in collectors:
+        stats.record(statement, seconds)
+
+
+@contextmanager
+def count_queries():
+    """Collects the statements run inside the block, e.g. around a test
+    client request:
+
+        with count_queries() as stats:
+            client.get('/bookings/')
+        assert stats.count <= 4
+    """
+    stats = QueryStats()
+    token = start_collecting(stats)
+    try:
+        yield stats
+    finally:
+        active_collectors.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries, allow_repeats=False):
+    """Fails the block with an AssertionError if it runs more than max_queries
+    statements, or (unless allow_repeats) repeats a statement shape often
+    enough to look like an N+1."""
+    with count_queries() as stats:
+        yield stats
+    problems = []
+    if stats.count > max_queries:
+        problems.append(f"{stats.count} queries, budget is {max_queries}")
+    if not allow_repeats:
+        problems.extend(f"repeated {count}x: {shape}" for shape, count in stats.repeated())
+    if problems:
+        raise AssertionError('; '.join(problems))
+
+
+# Request middleware, registered on the app in extensions.py when
+# QUERY_STATS is on. Queries run while a streamed response is being sent
+# happen after the headers are written and aren't counted.
+def start_request_stats():
+    g.query_stats = QueryStats()
+    g.query_stats_token = start_collecting(g.query_stats)
+
+def finish_request_stats(response):
+    stats = g.get('query_stats')
+    if stats is None:
+        return response
+
+    response.headers['X-Query-Count'] = str(stats.count)
+    response.headers['X-Query-Time-Ms'] = f"{stats.seconds * 1000:.1f}"
+    repeated = stats.repeated()
+    if repeated:
+        response.headers['X-Query-Repeated'] = str(len(repeated))
+        for shape, count in repeated:
+            logging.warning(f"Possible N+1 in {request.method} {request.path} ({request.endpoint}): {count}x {shape[:300]}")
+    return response
+
+def stop_request_stats(exception=None):
+    # Runs even when the view raised, so the collector never outlives its request
+    token = g.pop('query_stats_token', None)
+    if token is not None:
+        active_collectors.reset(token)
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from urllib.parse import urlencode
+from flask import current_app, make_response, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Tag, User
+from row_versions import CatalogWatcher
+
+# Included in every entry's tags so the whole cache can be dropped at once
+ALL_TAG = 'all'
+
+
+class MemoryCache:
+    """Per-process LRU of rendered responses."""
+
+    def __init__(self, max_entries):
+        self.lock = Lock()
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.tag_versions = {}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry or entry[0] <= time.monotonic():
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def versions(self, tags):
+        with self.lock:
+            return [self.tag_versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self.lock:
+            for tag in tags:
+                self.tag_versions[tag] = self.tag_versions.get(tag, 0) + 1
+
+
+class RedisCache:
+    """Responses shared by every worker through Redis or anything that speaks
+    its protocol. Needs the redis package."""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return json.loads(value) if value else None
+
+    def set(self, key, value, ttl):
+        self.client.set(key, json.dumps(value), ex=ttl)
+
+    def versions(self, tags):
+        return [int(version or 0) for version in self.client.mget([f"cache-version:{tag}" for tag in tags])]
+
+    def bump(self, tags):
+        pipeline = self.client.pipeline()
+        for tag in tags:
+            pipeline.incr(f"cache-version:{tag}")
+        pipeline.execute()
+
+
+class ResponseCache:
+    """Caches whole GET responses with an ETag.
+
+    Entries aren't deleted on writes. Each one is tagged (e.g. 'experiences',
+    'experience:3'), and its key includes the current version of every tag.
+    Invalidating a tag bumps its version, so older entries stop being looked
+    up and age out. This works the same in-process and in Redis.
+
+    Redis shares the tag versions between workers. A per-process cache only
+    hears about its own worker's commits, so a background watcher invalidates
+    what other workers, seed scripts and bulk loads change."""
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 0
+        self.changes = None
+        self.check_seconds = 0
+
+    def init_app(self, app):
+        kind = app.config['RESPONSE_CACHE']
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        self.changes = None
+        if kind == 'memory':
+            self.backend = MemoryCache(app.config['RESPONSE_CACHE_SIZE'])
+            self.changes = CatalogWatcher(self.apply_remote, 'response cache watcher', tags=True)
+            self.check_seconds = app.config['RESPONSE_CACHE_CHECK_SECONDS']
+        elif kind == 'redis':
+            self.backend = RedisCache(app.config['RESPONSE_CACHE_URL'])
+        else:
+            self.backend = None
+
+    def apply_remote(self, experience_ids, tag_ids):
+        # Runs on the watcher thread. Tag names show in every experience
+        # response, so a tag changed elsewhere drops everything.
+        if tag_ids:
+            self.bump([ALL_TAG])
+        else:
+            self.bump(['experiences'] + [
+                f"{tag}:{experience_id}" for experience_id in experience_ids for tag in ('experience', 'images')
+            ])
+
+    def key(self, tags):
+        versions = self.backend.versions(tags)
+        raw = f"{request.path}?{urlencode(sorted(request.args.items(multi=True)))}|{versions}"
+        return 'response:' + hashlib.sha1(raw.encode()).hexdigest()
+
+    def cached(self, *tags):
+        # Tags can name view arguments, e.g. 'experience:{experience_id}'
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.backend is None:
+                    return view(*args, **kwargs)
+                if self.changes:
+                    self.changes.watch(current_app._get_current_object(), self.check_seconds)
+
+                entry_tags = [ALL_TAG] + [tag.format(**kwargs) for tag in tags]
+                try:
+                    key = self.key(entry_tags)
+                    entry = self.backend.get(key)
+                except Exception as e:
+                    logging.error(f"Response cache lookup failed: {e}")
+                    return view(*args, **kwargs)
+
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    # Streamed responses are never buffered into the cache
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    body = response.get_data(as_text=True)
+                    # Keep the view's own ETag when it sets one
+                    etag, weak = response.get_etag()
+                    if not etag:
+                        etag, weak = hashlib.sha1(body.encode()).hexdigest(), False
+                    entry = {
+                        'body': body,
+                        'etag': etag,
+                        'weak': weak,
+                        'mimetype': response.mimetype
+                    }
+                    try:
+                        self.backend.set(key, entry, self.ttl)
+                    except Exception as e:
+                        logging.error(f"Response cache store failed: {e}")
+
+                response = make_response(entry['body'], 200)
+                response.mimetype = entry['mimetype']
+                response.set_etag(entry['etag'], weak=entry['weak'])
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
+
+    def invalidate(self, *tags):
+        # Applied when the current transaction commits, so a concurrent read
+        # can't cache the old data again in between
+        db.session.info.setdefault('response_cache_tags', set()).update(tags)
+
+    def invalidate_experience(self, experience_id):
+        self.invalidate('experiences', f"experience:{experience_id}")
+
+    def bump(self, tags):
+        if self.backend is None or not tags:
+            return
+        try:
+            self.backend.bump(tags)
+        except Exception as e:
+            logging.error(f"Response cache invalidation failed: {e}")
+
+    def clear(self):
+        self.bump([ALL_TAG])
+
+
+response_cache = ResponseCache()
+
+# Tags have no write routes of their own, so any tag change made through the
+# ORM invalidates /tags/. A rename or delete also shows in every experience
+# response that lists the tag, so those drop everything, as does renaming a
+# user, whose name shows with their reviews.
+@event.listens_for(Session, 'after_flush')
+def collect_tag_invalidations(session, flush_context):
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, Tag):
+            tags = session.info.setdefault('response_cache_tags', set())
+            tags.add('tags')
+            if instance not in session.new:
+                tags.add(ALL_TAG)
+        elif isinstance(instance, User) and instance in session.dirty:
+            state = inspect(instance)
+            if any(state.attrs[name].history.has_changes() for name in ('first_name', 'last_name')):
+                session.info.setdefault('response_cache_tags', set()).add(ALL_TAG)
+
+@event.listens_for(Session, 'after_commit')
+def apply_cache_invalidations(session):
+    response_cache.bump(session.info.pop('response_cache_tags', None))
+
+@event.listens_for(Session, 'after_rollback')
+def discard_cache_invalidations(session):
+    session.info.pop('response_cache_tags', None)
@@ -1,17 +1,17 @@
 from models import User
 from flask import Flask, request, jsonify, Blueprint
 from extensions import db
-from argon2 import PasswordHasher
 from flask_cors import CORS
+from sqlalchemy import update
 import jwt
 import os
 from datetime import datetime, timedelta, timezone
 from config import Config
+from passwords import PasswordPoolBusy, password_pool
 
 api = Blueprint('api', __name__)
 
 # AUTHENTICATION
-ph = PasswordHasher()
 
 def generate_token(user):
     """Generate a JWT token for the user"""
@@ -20,6 +20,8 @@ def generate_token(user):
         'sub': user.email,
         'name': name,
         'user_id': user.id,
+        'admin': bool(user.admin),
+        'gen': user.token_generation or 0,
         'exp': datetime.now(timezone.utc) + timedelta(days=30)  # Token expires in 30 days
     }
     return jwt.encode(payload, Config.SECRET_KEY, algorithm='HS256')
@@ -61,7 +63,11 @@ def register():
     if existing_user:
         return jsonify({"error": "Email already registered"}), 409
 
-    hashed_password = ph.hash(password)
+    try:
+        hashed_password = password_pool.hash(password)
+    except PasswordPoolBusy:
+        return jsonify({"error": "Server busy, please try again"}), 503
+
     new_user = User(email=email, password_hash=hashed_password, first_name=first_name, last_name=last_name, phone_number=phone_number)
 
     try:
@@ -98,9 +104,17 @@ def login():
         return jsonify({"error": "Invalid credentials"}), 401
 
     try:
-        # For testing purposes, verify plain text password
-        # TODO: Use hashed password verification after hashing the seed passwords in init.sql
-        if password == user.password_hash:
+        matches, needs_rehash = password_pool.verify(user.password_hash, password)
+        if matches:
+            if needs_rehash:
+                # Same password under new parameters, so written with an
+                # UPDATE that skips the flush hook revoking tokens on
+                # credential changes
+                db.session.execute(
+                    update(User).where(User.id == user.id).values(password_hash=password_pool.hash(password))
+                )
+                db.session.commit()
+
             token = generate_token(user)
             name = f"{user.first_name} {user.last_name}".strip()
 
@@ -114,6 +128,10 @@ def login():
             })
 
         return jsonify({"error": "Invalid credentials"}), 401
+    except PasswordPoolBusy:
+        db.session.rollback()
+        return jsonify({"error": "Server busy, please try again"}), 503
     except Exception as e:
+        db.session.rollback()
         print(f"Login error: {e}")
         return jsonify({"error": "Invalid credentials"}), 401
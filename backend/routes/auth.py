@@ -1,60 +1,169 @@
 from models import Review, User
+from collections import OrderedDict
 from functools import wraps
-from flask import request, jsonify
+from threading import Lock
+from flask import g, request, jsonify
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+from extensions import db
 import jwt
+import time
 from config import Config
 
-def verify_jwt():
+# Verified tokens are remembered for a few minutes so repeat requests skip the
+# signature check. The cache is bounded and drops the least recently used first.
+TOKEN_CACHE_SIZE = 1024
+TOKEN_CACHE_TTL_SECONDS = 300
+# Whether a token's user still exists, is an admin and which token generation
+# it is at are read from the users row and kept this long. Changes committed
+# in this process apply at once; other workers see them within the TTL.
+USER_STATE_TTL_SECONDS = 30
+# Columns whose change revokes the user's existing tokens
+CREDENTIAL_COLUMNS = ('password_hash', 'email', 'admin')
+
+verified_tokens = OrderedDict()
+user_states = OrderedDict()
+token_lock = Lock()
+
+def load_user_state(user_id):
+    # (token generation, admin) for a user, or None if there is no such user
+    now = time.time()
+    with token_lock:
+        entry = user_states.get(user_id)
+        if entry and entry[0] > now:
+            user_states.move_to_end(user_id)
+            return entry[1]
+
+    row = db.session.execute(
+        select(User.token_generation, User.admin).where(User.id == user_id)
+    ).first()
+    state = (row.token_generation, bool(row.admin)) if row else None
+
+    with token_lock:
+        user_states[user_id] = (now + USER_STATE_TTL_SECONDS, state)
+        user_states.move_to_end(user_id)
+        while len(user_states) > TOKEN_CACHE_SIZE:
+            user_states.popitem(last=False)
+    return state
+
+def revoke_user_tokens(session, user_id):
+    # Bumped in the caller's transaction, so the revocation is stored with
+    # the change that caused it and seen by every worker
+    session.connection().execute(
+        update(User).where(User.id == user_id).values(token_generation=User.token_generation + 1)
+    )
+    session.info.setdefault('revoked_users', set()).add(user_id)
+
+@event.listens_for(Session, 'after_flush')
+def revoke_changed_credentials(session, flush_context):
+    for instance in session.dirty:
+        if isinstance(instance, User):
+            state = inspect(instance)
+            if any(state.attrs[name].history.has_changes() for name in CREDENTIAL_COLUMNS):
+                revoke_user_tokens(session, instance.id)
+    for instance in session.deleted:
+        if isinstance(instance, User):
+            session.info.setdefault('revoked_users', set()).add(instance.id)
+
+@event.listens_for(Session, 'after_commit')
+def forget_revoked_users(session):
+    revoked = session.info.pop('revoked_users', ())
+    with token_lock:
+        for user_id in revoked:
+            user_states.pop(user_id, None)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_revoked_users(session):
+    session.info.pop('revoked_users', None)
+
+def decode_jwt():
     auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
         return None
 
-    try:
-        token = auth_header.split(' ')[1]
-        payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
+    token = auth_header.split(' ')[1]
+    now = time.time()
+    with token_lock:
+        entry = verified_tokens.get(token)
+        if entry and entry[0] > now:
+            verified_tokens.move_to_end(token)
+            payload = entry[1]
+        else:
+            payload = None
+
+    if payload is None:
+        try:
+            payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return None
+        except jwt.InvalidTokenError:
+            return None
+
+        # Never cache a token past its own expiry
+        expires_at = min(now + TOKEN_CACHE_TTL_SECONDS, payload.get('exp', now))
+        with token_lock:
+            verified_tokens[token] = (expires_at, payload)
+            verified_tokens.move_to_end(token)
+            while len(verified_tokens) > TOKEN_CACHE_SIZE:
+                verified_tokens.popitem(last=False)
+
+    # Deleted users and tokens issued before a revocation are turned away
+    state = load_user_state(payload.get('user_id'))
+    if state is None or payload.get('gen', 0) < state[0]:
         return None
+    return payload
+
+# The decorators and the handler behind them all ask for the current user, so
+# the decoded token and the loaded user are kept on g for the rest of the request
+def verify_jwt():
+    if 'jwt_payload' not in g:
+        g.jwt_payload = decode_jwt()
+    return g.jwt_payload
 
 def get_current_user():
-    payload = verify_jwt()
-    if not payload:
-        return None
+    if 'current_user' not in g:
+        payload = verify_jwt()
+        user_id = payload.get('user_id') if payload else None
+        g.current_user = db.session.get(User, user_id) if user_id else None
+    return g.current_user
 
-    user = User.query.filter_by(id=payload.get('user_id')).first()
-    return user
+# Identity comes from the signed claims and role from the cached user state,
+# so checks that only need them don't load the user
+def get_current_user_id():
+    payload = verify_jwt()
+    return payload.get('user_id') if payload else None
 
 def is_review_owner(review_id):
-    user = get_current_user()
-    if not user:
+    user_id = get_current_user_id()
+    if not user_id:
         return False
 
     review = Review.query.get(review_id)
     if not review:
         return False
 
-    return user.id == review.user_id
+    return user_id == review.user_id
 
 def is_admin():
-    user = get_current_user()
-    if not user:
+    # From the users row rather than the token's admin claim, so a revoked
+    # role stops working without waiting for the token to expire
+    payload = verify_jwt()
+    if not payload:
         return False
-    return user.admin
+    state = load_user_state(payload.get('user_id'))
+    return bool(state and state[1])
 
 def is_authorized(resource_user_id):
-    user = get_current_user()
-    if not user:
+    user_id = get_current_user_id()
+    if not user_id:
         return False
-    return user.id == resource_user_id or user.admin
+    return user_id == resource_user_id or is_admin()
 
 # Decorator for general authentication
 def require_auth(func):
     @wraps(func)
     def check_auth(*args, **kwargs):
-        user = get_current_user()
-        if not user:
+        if not get_current_user_id():
             return jsonify({"error": "Authentication required"}), 401
         return func(*args, **kwargs)
     return check_auth
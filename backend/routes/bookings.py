@@ -1,62 +1,190 @@
 from flask import Blueprint, request, jsonify
 from extensions import db
 from datetime import datetime, timezone
-from routes.auth import require_auth, get_current_user
-from models import Booking, Reservation, Experience, PaymentMethod, Payment
+from routes.auth import require_auth, get_current_user_id
+from models import Booking, Reservation, Experience, ExperienceSchedule, PaymentMethod, Payment
+from routes.idempotency import start_idempotent_request, finish_idempotent_request
+from routes.etags import not_modified, versions_etag, with_etag
+from row_versions import bump_versions, shown_version
+from availability import lock_slots, full_slots, mark_booked_changed
+from sqlalchemy import and_, delete, exists, func, insert, or_, select
 import uuid
 import logging
 
 bookings = Blueprint('bookings', __name__)
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
 
 def generate_confirmation_code():
     return str(uuid.uuid4())[:8].upper()
 
 def is_authorized(resource_user_id):
-    return resource_user_id == get_current_user().id
+    return resource_user_id == get_current_user_id()
+
+def valid_guests(guests):
+    # bool is an int subclass but not a guest count
+    return isinstance(guests, int) and not isinstance(guests, bool) and guests > 0
 
 def validate_reservation_fields(res_data):
     return all(key in res_data for key in ['date', 'time_slot'])
 
+def parse_reservations(items, status=None):
+    # Parses and validates the whole batch before anything is written. Raises
+    # ValueError with the message to send back for the first bad entry.
+    if not isinstance(items, list):
+        raise ValueError('Expected an array of reservations')
+
+    now = datetime.now(timezone.utc)
+    rows = []
+    for res_data in items:
+        if not isinstance(res_data, dict) or not validate_reservation_fields(res_data):
+            raise ValueError('Each reservation requires date and time_slot')
+        try:
+            rows.append({
+                'date': datetime.fromisoformat(res_data['date']).date(),
+                'time_slot': datetime.fromisoformat(res_data['time_slot']).time(),
+                'status': status or res_data.get('status', 'pending'),
+                'created_at': now
+            })
+        except (TypeError, ValueError):
+            raise ValueError('Reservation date and time_slot must be ISO datetimes')
+    return rows
+
+def insert_reservations(booking, rows):
+    # One multi-row INSERT ... RETURNING for the whole batch
+    if not rows:
+        return []
+    mark_booked_changed(booking.experience_id)
+    bump_versions(db.session, Booking, [booking.id])
+    return db.session.scalars(
+        insert(Reservation).returning(Reservation),
+        [dict(row, booking_id=booking.id) for row in rows]
+    ).all()
+
+def delete_booking_reservations(booking, reservation_ids=None):
+    # One DELETE for the booking's reservations, or just the listed ones.
+    # Returns how many rows went.
+    statement = delete(Reservation).where(Reservation.booking_id == booking.id)
+    if reservation_ids is not None:
+        statement = statement.where(Reservation.id.in_(reservation_ids))
+    deleted = db.session.execute(statement.returning(Reservation.id)).all()
+    if deleted:
+        mark_booked_changed(booking.experience_id)
+        bump_versions(db.session, Booking, [booking.id])
+    return len(deleted)
+
+def full_dates(experience, dates, guests, exclude_booking_id=None):
+    # Locks the slots until commit so two requests can't both take the last
+    # places on the same day, then returns the dates without room for `guests`
+    schedule = experience.schedule
+    if not schedule or schedule.capacity is None or not dates:
+        return []
+    lock_slots(experience.id, dates)
+    return full_slots(schedule, dates, guests, exclude_booking_id)
+
+def no_availability(full):
+    db.session.rollback()
+    return jsonify({
+        'error': 'Not enough availability for the requested dates',
+        'full_dates': [day.isoformat() for day in full]
+    }), 409
+
+def is_current_booking(now):
+    # A booking is current while any of its reservations hasn't ended yet.
+    # Reservations end at the schedule's end_time, or at their own time_slot
+    # when the schedule has none. Needs ExperienceSchedule joined on the
+    # booking's experience.
+    today, now_time = now.date(), now.time().replace(tzinfo=None)
+    reservation_end = func.coalesce(ExperienceSchedule.end_time, Reservation.time_slot)
+    return exists().where(
+        Reservation.booking_id == Booking.id,
+        or_(
+            Reservation.date > today,
+            and_(Reservation.date == today, reservation_end >= now_time)
+        )
+    )
+
+def booking_rows_query(user_id, now, scope=None, cursor=None, limit=None):
+    # A user's booking ids and versions, newest first, with whether each is
+    # current. A scope keeps only the current or only the past ones.
+    is_current = is_current_booking(now)
+    statement = (
+        select(
+            Booking.id,
+            Booking.version,
+            Booking.experience_id,
+            Experience.version.label('experience_version'),
+            is_current.label('is_current')
+        )
+        .join(Experience, Experience.id == Booking.experience_id)
+        .outerjoin(ExperienceSchedule, ExperienceSchedule.experience_id == Booking.experience_id)
+        .where(Booking.user_id == user_id)
+        .order_by(Booking.id.desc())
+    )
+    if scope:
+        statement = statement.where(is_current if scope == 'current' else ~is_current)
+    if cursor:
+        statement = statement.where(Booking.id < cursor)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
 @bookings.route('/', methods=['GET'])
 @require_auth
 def get_all_bookings():
-    user = get_current_user()
+    user_id = get_current_user_id()
     now = datetime.now(timezone.utc)
-
-    all_bookings = Booking.query.filter_by(user_id=user.id).all()
-
-    past_bookings = []
-    current_bookings = []
-
-    for booking in all_bookings:
-        is_current = False
-
-        for reservation in booking.reservations:
-            reservation_datetime = datetime.combine(reservation.date, reservation.time_slot).replace(tzinfo=timezone.utc)
-            experience_schedule = booking.experience.schedule
-
-            if experience_schedule and experience_schedule.end_time:
-                try:
-                    reservation_end = datetime.combine(reservation.date, experience_schedule.end_time).replace(tzinfo=timezone.utc)
-                except Exception:
-                    reservation_end = reservation_datetime
-            else:
-                reservation_end = reservation_datetime  # fallback to just start time
-
-            if reservation_end >= now:
-                is_current = True
-                break
-
-        if is_current:
-            current_bookings.append(booking.to_dict())
-        else:
-            past_bookings.append(booking.to_dict())
-            
-    return jsonify({
-        'past_bookings': past_bookings,
-        'current_bookings': current_bookings
-    }), 200
+    scope = request.args.get('scope')
+    if scope not in (None, 'current', 'past'):
+        return jsonify({'error': 'scope must be current or past'}), 400
+    # Lists default to the lightweight card shape, except the unscoped split
+    # older clients read, which keeps the full booking
+    profile = request.args.get('profile', 'card' if scope else 'full')
+    if profile not in ('card', 'full'):
+        return jsonify({'error': 'profile must be card or full'}), 400
+
+    # Ids and versions come first. The ETag is built from them, so an
+    # unchanged list is answered before any booking is loaded or serialized.
+    next_cursor = None
+    if scope:
+        cursor = request.args.get('cursor', type=int)
+        limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+
+        rows = db.session.execute(booking_rows_query(user_id, now, scope, cursor, limit + 1)).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1].id
+    else:
+        rows = db.session.execute(booking_rows_query(user_id, now)).all()
+
+    # The full profile also shows the experiences' tags and reviews
+    shown = shown_version(db.session, {row.experience_id for row in rows}) if profile == 'full' else None
+    etag = versions_etag(scope, profile, next_cursor, [tuple(row) for row in rows], shown)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    if profile == 'card':
+        options, serialize = Booking.card_load_options(), Booking.to_card_dict
+    else:
+        options, serialize = Booking.load_options(), Booking.to_dict
+    loaded = Booking.query.options(*options).filter(Booking.id.in_([row.id for row in rows])).all()
+    serialized = {booking.id: serialize(booking) for booking in loaded}
+
+    if not scope:
+        # Unpaginated split of every booking, kept for older clients
+        response = jsonify({
+            'past_bookings': [serialized[row.id] for row in rows if row.id in serialized and not row.is_current],
+            'current_bookings': [serialized[row.id] for row in rows if row.id in serialized and row.is_current]
+        })
+    else:
+        response = jsonify({
+            'bookings': [serialized[row.id] for row in rows if row.id in serialized],
+            'next_cursor': next_cursor
+        })
+    return with_etag(response, etag), 200
     
 @bookings.route('/<int:booking_id>', methods=['GET'])
 @require_auth
@@ -69,11 +197,13 @@ def get_booking(booking_id):
 @bookings.route('/', methods=['POST'])
 @require_auth
 def create_booking():
-    user = get_current_user()
+    user_id = get_current_user_id()
     data = request.get_json()
     
     if not all(key in data for key in ['experience_id', 'number_of_guests', 'payment_method_id']):
         return jsonify({'error': 'Missing required fields'}), 400
+    if not valid_guests(data['number_of_guests']):
+        return jsonify({'error': 'number_of_guests must be a positive integer'}), 400
 
     payment_method = PaymentMethod.query.get_or_404(data['payment_method_id'])
     if not is_authorized(payment_method.user_id):
@@ -84,48 +214,44 @@ def create_booking():
         return jsonify({'error': 'Experience not found'}), 404
 
     try:
-        experience = Experience.query.get_or_404(data['experience_id'])
+        reservations = [Reservation(**row) for row in parse_reservations(data.get('reservations', []), status='pending')]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        idempotency_record, replayed = start_idempotent_request(user_id)
+        if replayed:
+            return replayed
+
+        full = full_dates(experience, [reservation.date for reservation in reservations], data['number_of_guests'])
+        if full:
+            return no_availability(full)
+
         new_booking = Booking(
-            user_id=user.id,
-            experience_id=data['experience_id'],
+            user_id=user_id,
+            experience_id=experience.id,
             number_of_guests=data['number_of_guests'],
             confirmation_code=generate_confirmation_code(),
             bundle_id=data.get('bundle_id'),
             status='pending',
-            created_at=datetime.now(timezone.utc)
+            created_at=datetime.now(timezone.utc),
+            reservations=reservations
         )
-
-        db.session.add(new_booking)
-        db.session.flush()
-        
-        price = experience.price * data['number_of_guests']
-        
-        payment = Payment(
-            user_id=user.id,
-            booking_id=new_booking.id,
-            amount=price,
+        new_booking.payment.append(Payment(
+            user_id=user_id,
+            amount=experience.price * data['number_of_guests'],
             payment_method_id=data['payment_method_id'],
             status="Confirmed"
-        )
-        db.session.add(payment)
-        db.session.flush()
-
-        if 'reservations' in data:
-            for res_data in data['reservations']:
-                if not validate_reservation_fields(res_data):
-                    return jsonify({'error': 'Reservation requires date and time_slot'}), 400
+        ))
 
-                new_res = Reservation(
-                    booking_id=new_booking.id,
-                    date=datetime.fromisoformat(res_data['date']).date(),
-                    time_slot=datetime.fromisoformat(res_data['time_slot']).time(),
-                    status='pending',
-                    created_at=datetime.now(timezone.utc)
-                )
-                db.session.add(new_res)
+        # Booking, payment and reservations go out in a single flush
+        db.session.add(new_booking)
+        db.session.flush()
 
+        body = new_booking.to_dict()
+        finish_idempotent_request(idempotency_record, body, 201)
         db.session.commit()
-        return jsonify(new_booking.to_dict()), 201
+        return jsonify(body), 201
 
     except Exception as e:
         db.session.rollback()
@@ -140,27 +266,33 @@ def update_booking(booking_id):
         return jsonify({'error': 'Not authorized to update this booking'}), 403
 
     data = request.get_json()
+    if 'number_of_guests' in data and not valid_guests(data['number_of_guests']):
+        return jsonify({'error': 'number_of_guests must be a positive integer'}), 400
+
+    rows = None
+    if 'reservations' in data:
+        try:
+            rows = parse_reservations(data['reservations'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
     try:
-        if 'number_of_guests' in data:
-            booking.number_of_guests = data['number_of_guests']
-
-        if 'reservations' in data:
-            for r in booking.reservations:
-                db.session.delete(r)
-
-            for res_data in data['reservations']:
-                if not validate_reservation_fields(res_data):
-                    return jsonify({'error': 'Reservation requires date and time_slot'}), 400
-
-                new_res = Reservation(
-                    booking_id=booking.id,
-                    date=datetime.fromisoformat(res_data['date']).date(),
-                    time_slot=datetime.fromisoformat(res_data['time_slot']).time(),
-                    status=res_data.get('status', 'pending'),
-                    created_at=datetime.now(timezone.utc)
-                )
-                db.session.add(new_res)
+        guests = data.get('number_of_guests', booking.number_of_guests)
+        if rows is not None:
+            dates = [row['date'] for row in rows]
+        elif guests != booking.number_of_guests:
+            dates = [reservation.date for reservation in booking.reservations]
+        else:
+            dates = []
+
+        full = full_dates(booking.experience, dates, guests, exclude_booking_id=booking.id)
+        if full:
+            return no_availability(full)
+
+        booking.number_of_guests = guests
+        if rows is not None:
+            delete_booking_reservations(booking)
+            insert_reservations(booking, rows)
 
         db.session.commit()
         return jsonify(booking.to_dict()), 200
@@ -194,32 +326,25 @@ def manage_reservations(booking_id):
     if not is_authorized(booking.user_id):
         return jsonify({'error': 'Not authorized to manage reservations'}), 403
 
-    data = request.get_json()
-    if not isinstance(data, list):
-        return jsonify({'error': 'Expected an array of reservations'}), 400
+    try:
+        rows = parse_reservations(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     try:
+        full = full_dates(booking.experience, [row['date'] for row in rows], booking.number_of_guests,
+                          exclude_booking_id=booking.id)
+        if full:
+            return no_availability(full)
+
         if request.args.get('replace', 'false').lower() == 'true':
-            for r in booking.reservations:
-                db.session.delete(r)
-
-        new_reservations = []
-        for res_data in data:
-            if not validate_reservation_fields(res_data):
-                return jsonify({'error': 'Each reservation requires date and time_slot'}), 400
-
-            new_res = Reservation(
-                booking_id=booking.id,
-                date=datetime.fromisoformat(res_data['date']).date(),
-                time_slot=datetime.fromisoformat(res_data['time_slot']).time(),
-                status=res_data.get('status', 'pending'),
-                created_at=datetime.now(timezone.utc)
-            )
-            db.session.add(new_res)
-            new_reservations.append(new_res)
+            delete_booking_reservations(booking)
+
+        new_reservations = insert_reservations(booking, rows)
+        body = {'reservations': [r.to_dict() for r in new_reservations]}
 
         db.session.commit()
-        return jsonify({'reservations': [r.to_dict() for r in new_reservations]}), 201
+        return jsonify(body), 201
 
     except Exception as e:
         db.session.rollback()
@@ -234,17 +359,11 @@ def delete_reservations(booking_id):
         return jsonify({'error': 'Not authorized to delete reservations'}), 403
 
     data = request.get_json()
-    if not isinstance(data, list):
+    if not isinstance(data, list) or not all(isinstance(res_id, int) for res_id in data):
         return jsonify({'error': 'Expected an array of reservation ids'}), 400
 
     try:
-        deleted_count = 0
-        for res_id in data:
-            res = Reservation.query.filter_by(id=res_id, booking_id=booking_id).first()
-            if res:
-                db.session.delete(res)
-                deleted_count += 1
-
+        deleted_count = delete_booking_reservations(booking, data) if data else 0
         db.session.commit()
         return jsonify({
             'message': f'Successfully deleted {deleted_count} reservations',
@@ -0,0 +1,19 @@
+import hashlib
+from flask import make_response, request
+
+def versions_etag(*parts):
+    # Weak validator over what shapes a response: the ids and versions of its
+    # rows plus anything else that changes the output, like the page cursor
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+def not_modified(etag):
+    # A 304 when the client already has this version, otherwise None
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+def with_etag(response, etag):
+    response.set_etag(etag, weak=True)
+    return response
@@ -1,30 +1,219 @@
-from models import Experience, Tag
+from models import Experience, ExperienceSchedule, Tag, EXPERIENCE_PROFILES
 from flask import jsonify, Blueprint, request
 from extensions import db
 from routes.auth import require_admin
+from response_cache import response_cache
+from routes.etags import not_modified, versions_etag, with_etag
+from routes.streaming import ndjson_response, wants_ndjson
+from availability import availability_index
+from row_versions import shown_version
+from sqlalchemy import and_, func, or_, select
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+import base64
+import json
+import re
 
 experiences = Blueprint('experiences', __name__)
 
-# Get all experiences
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+LIKE_WILDCARDS = re.compile(r'[\\%_]')
+
+DEFAULT_AVAILABILITY_DAYS = 30
+MAX_AVAILABILITY_DAYS = 366
+
+# Sort keys for the paginated listing: the column to order by, how to read the
+# same value off a loaded row for the next cursor, and how to parse it back.
+# Every key is paired with the id so the ordering is total and stable.
+SORT_KEYS = {
+    'id': (Experience.id, lambda exp: exp.id, int),
+    'title': (Experience.title, lambda exp: exp.title, str),
+    'price': (func.coalesce(Experience.price, 0), lambda exp: str(exp.price or 0), Decimal),
+    'rating': (func.coalesce(Experience.average_rating, 0), lambda exp: str(exp.average_rating or 0), Decimal),
+}
+
+# What a listing page reads before anything is loaded: ids and versions for
+# the ETag, plus the sort columns the cursor reads
+PAGE_COLUMNS = (Experience.id, Experience.version, Experience.title, Experience.price, Experience.average_rating)
+
+def get_profile():
+    profile = request.args.get('profile', 'full')
+    return profile if profile in EXPERIENCE_PROFILES else None
+
+def encode_cursor(value, last_id):
+    raw = json.dumps([value, last_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor, parse):
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return parse(value), int(last_id)
+    except (ValueError, TypeError, InvalidOperation):
+        raise ValueError('Invalid cursor')
+
+def filter_experiences(query, args):
+    tag_id = args.get('tag', type=int)
+    if tag_id is not None:
+        query = query.filter(Experience.tags.any(Tag.id == tag_id))
+
+    # Case-insensitive prefix match ("par" finds "Paris, France"), which
+    # ix_experiences_location_lower can answer. LIKE wildcards typed by the
+    # client are matched literally.
+    location = args.get('location', '').strip().lower()
+    if location:
+        pattern = LIKE_WILDCARDS.sub(r'\\\g<0>', location) + '%'
+        query = query.filter(func.lower(Experience.location).like(pattern, escape='\\'))
+
+    try:
+        min_price = Decimal(args['min_price']) if 'min_price' in args else None
+        max_price = Decimal(args['max_price']) if 'max_price' in args else None
+        min_rating = float(args['min_rating']) if 'min_rating' in args else None
+    except (ValueError, InvalidOperation):
+        raise ValueError('min_price, max_price and min_rating must be numbers')
+
+    # Compared on the sort expressions, which treat a missing price or rating
+    # as 0, so ix_experiences_price_id and ix_experiences_rating_id serve both
+    price, rating = SORT_KEYS['price'][0], SORT_KEYS['rating'][0]
+    if min_price is not None:
+        query = query.filter(price >= min_price)
+    if max_price is not None:
+        query = query.filter(price <= max_price)
+    if min_rating is not None:
+        query = query.filter(rating >= min_rating)
+
+    return query
+
+def sort_experiences(query, args):
+    """Orders the query by the requested sort key and skips past the cursor.
+    Returns it with the function reading the sort value off a row."""
+    sort = args.get('sort', 'id')
+    descending = sort.startswith('-')
+    sort_name = sort.lstrip('-')
+    if sort_name not in SORT_KEYS:
+        raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)} (prefix with - for descending)")
+    column, read_value, parse = SORT_KEYS[sort_name]
+
+    cursor = args.get('cursor')
+    if cursor:
+        value, last_id = decode_cursor(cursor, parse)
+        if descending:
+            query = query.filter(or_(column < value, and_(column == value, Experience.id < last_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, Experience.id > last_id)))
+
+    if descending:
+        query = query.order_by(column.desc(), Experience.id.desc())
+    else:
+        query = query.order_by(column.asc(), Experience.id.asc())
+    return query, read_value
+
+def page_limit(args):
+    limit = args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def paginate_experiences(query, args):
+    query, read_value = sort_experiences(query, args)
+    limit = page_limit(args)
+
+    # Fetch one extra row to know whether another page exists without a COUNT
+    rows = query.limit(limit + 1).all()
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(read_value(last), last.id)
+
+    return page, next_cursor
+
+# Get all experiences, one page at a time
 @experiences.route('/', methods=['GET'])
+@response_cache.cached('experiences')
 def get_experiences():
+    profile = get_profile()
+    if not profile:
+        return jsonify({'error': f"profile must be one of {', '.join(EXPERIENCE_PROFILES)}"}), 400
+
     try:
-        experiences = Experience.query.all()
-        return jsonify({'experiences': [exp.to_dict() for exp in experiences]}), 200
+        if wants_ndjson():
+            # Every matching experience in id order, unpaginated
+            statement = select(Experience).options(*Experience.load_options(profile)).order_by(Experience.id)
+            statement = filter_experiences(statement, request.args)
+            return ndjson_response(statement, lambda row: row.Experience.to_dict(profile))
+
+        # Page through ids and versions (plus the sort columns the cursor
+        # reads) first. The ETag is built from them, so an unchanged page is
+        # answered before anything is loaded or serialized.
+        query = db.session.query(*PAGE_COLUMNS)
+        query = filter_experiences(query, request.args)
+        page, next_cursor = paginate_experiences(query, request.args)
+
+        reviewed = [row.id for row in page] if 'reviews' in EXPERIENCE_PROFILES[profile] else None
+        etag = versions_etag(
+            profile, next_cursor, [(row.id, row.version) for row in page],
+            shown_version(db.session, reviewed)
+        )
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+
+        loaded = (
+            Experience.query
+            .options(*Experience.load_options(profile))
+            .filter(Experience.id.in_([row.id for row in page]))
+            .all()
+        )
+        by_id = {exp.id: exp for exp in loaded}
+        response = jsonify({
+            'experiences': [by_id[row.id].to_dict(profile) for row in page if row.id in by_id],
+            'next_cursor': next_cursor
+        })
+        return with_etag(response, etag), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in get_experiences: {e}")
         return jsonify({'error': 'Failed to fetch experiences'}), 500
 
 # Get a specific experience
 @experiences.route('/<int:experience_id>', methods=['GET'])
+@response_cache.cached('experience:{experience_id}')
 def get_experience(experience_id):
     try:
-        experience = Experience.query.get_or_404(experience_id)
+        experience = Experience.query.options(*Experience.load_options()).filter_by(id=experience_id).first_or_404()
         return jsonify({'experience': experience.to_dict()}), 200
     except Exception as e:
         print(f"Error in get_experience: {e}")
         return jsonify({'error': 'Failed to fetch experience'}), 500
 
+# Get the bookable slots of an experience between two dates
+@experiences.route('/<int:experience_id>/availability', methods=['GET'])
+def get_experience_availability(experience_id):
+    try:
+        start = date.fromisoformat(request.args['from']) if 'from' in request.args else datetime.now(timezone.utc).date()
+        end = date.fromisoformat(request.args['to']) if 'to' in request.args else start + timedelta(days=DEFAULT_AVAILABILITY_DAYS)
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO dates (YYYY-MM-DD)'}), 400
+
+    if end < start:
+        return jsonify({'error': 'to must not be before from'}), 400
+    if (end - start).days > MAX_AVAILABILITY_DAYS:
+        return jsonify({'error': f'Range cannot exceed {MAX_AVAILABILITY_DAYS} days'}), 400
+
+    schedule = ExperienceSchedule.query.filter_by(experience_id=experience_id).first()
+    if not schedule:
+        return jsonify({'error': 'Experience has no schedule'}), 404
+
+    try:
+        return jsonify({
+            'experience_id': experience_id,
+            'slots': availability_index.slots(schedule, start, end)
+        }), 200
+    except Exception as e:
+        print(f"Error in get_experience_availability: {e}")
+        return jsonify({'error': 'Failed to fetch availability'}), 500
+
 # Update an experience
 @experiences.route('/<int:experience_id>', methods=['PUT'])
 @require_admin
@@ -42,6 +231,7 @@ def update_experience(experience_id):
         experience.price = data['price']
 
     try:
+        response_cache.invalidate_experience(experience_id)
         db.session.commit()
         return jsonify({'experience': experience.to_dict()}), 200
     except Exception as e:
@@ -50,10 +240,21 @@ def update_experience(experience_id):
 
 # Get experiences with a specific tag
 @experiences.route('/tag/<int:tag_id>', methods=['GET'])
+@response_cache.cached('experiences')
 def get_experiences_by_tag(tag_id):
+    profile = get_profile()
+    if not profile:
+        return jsonify({'error': f"profile must be one of {', '.join(EXPERIENCE_PROFILES)}"}), 400
+
     try:
-        experiences = Experience.query.join(Experience.tags).filter(Tag.id == tag_id).all()
-        return jsonify({'experiences': [experience.to_dict() for experience in experiences]}), 200
+        experiences = (
+            Experience.query
+            .options(*Experience.load_options(profile))
+            .join(Experience.tags)
+            .filter(Tag.id == tag_id)
+            .all()
+        )
+        return jsonify({'experiences': [experience.to_dict(profile) for experience in experiences]}), 200
     except Exception as e:
         print(f"Error in get_experiences_by_tag: {e}")
         return jsonify({'error': 'Failed to fetch experiences'}), 500
\ No newline at end of file
@@ -0,0 +1,63 @@
+from models import IdempotencyKey
+from flask import current_app, request, jsonify
+from extensions import db
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+
+# How long a key is remembered; purge-idempotency-keys clears older ones
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+def replay(record):
+    if record.response_body is None:
+        return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+    if record.request_hash != hashlib.sha256(request.get_data()).hexdigest():
+        return jsonify({'error': 'Idempotency-Key was already used with a different request'}), 422
+    return jsonify(json.loads(record.response_body)), record.status_code
+
+def start_idempotent_request(user_id):
+    """Claim the request's Idempotency-Key for this user.
+
+    Returns (record, None) when the request should run, with the claimed key
+    row added to the session, or (None, response) when it's a retry and the
+    stored response should be sent back as-is. Without the header it returns
+    (None, None) and the request runs normally."""
+    key = request.headers.get('Idempotency-Key')
+    if not key:
+        return None, None
+
+    existing = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    if existing:
+        return None, replay(existing)
+
+    record = IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        endpoint=request.endpoint,
+        request_hash=hashlib.sha256(request.get_data()).hexdigest()
+    )
+
+    try:
+        # Flushing now makes a concurrent request with the same key wait on
+        # the unique constraint until this transaction ends
+        db.session.add(record)
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        existing = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+        return None, replay(existing)
+
+    return record, None
+
+def finish_idempotent_request(record, body, status_code):
+    # Stored in the same transaction as the request's own writes
+    if record:
+        record.response_body = current_app.json.dumps(body)
+        record.status_code = status_code
+
+def purge_expired_idempotency_keys():
+    cutoff = datetime.now(timezone.utc) - IDEMPOTENCY_KEY_TTL
+    deleted = IdempotencyKey.query.filter(IdempotencyKey.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -2,11 +2,13 @@ from models import ExperienceImage, Experience
 from flask import Blueprint, request, jsonify
 from extensions import db
 from routes.auth import require_admin
+from response_cache import response_cache
 
 images = Blueprint('images', __name__)
 
 # Get all images from a specific experience
 @images.route('/<int:experience_id>/images', methods=['GET'])
+@response_cache.cached('images:{experience_id}')
 def get_experience_images(experience_id):
     try:
         experience = Experience.query.get_or_404(experience_id)
@@ -40,6 +42,8 @@ def add_experience_image(experience_id):
             db.session.add(new_image)
             new_images.append(new_image)
 
+        response_cache.invalidate_experience(experience_id)
+        response_cache.invalidate(f"images:{experience_id}")
         db.session.commit()
 
         return jsonify({
@@ -79,6 +83,8 @@ def delete_experience_images(experience_id):
             db.session.delete(image)
             deleted_count += 1
 
+        response_cache.invalidate_experience(experience_id)
+        response_cache.invalidate(f"images:{experience_id}")
         db.session.commit()
 
         return jsonify({
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from models import PaymentMethod, db
-from routes.auth import require_auth, get_current_user, is_authorized
+from routes.auth import require_auth, get_current_user_id, is_authorized
+from routes.etags import not_modified, versions_etag, with_etag
 import logging
 
 payment_methods = Blueprint('payment_methods', __name__)
@@ -8,9 +9,16 @@ payment_methods = Blueprint('payment_methods', __name__)
 @payment_methods.route('/', methods=['GET'])
 @require_auth
 def get_payment_methods():
-    user = get_current_user()
-    methods = PaymentMethod.query.filter_by(user_id=user.id, hidden=False).all()
-    return jsonify({'payment_methods': [method.to_dict() for method in methods]}), 200
+    user_id = get_current_user_id()
+    methods = PaymentMethod.query.filter_by(user_id=user_id, hidden=False).order_by(PaymentMethod.id).all()
+
+    etag = versions_etag([(method.id, method.version) for method in methods])
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    response = jsonify({'payment_methods': [method.to_dict() for method in methods]})
+    return with_etag(response, etag), 200
 
 @payment_methods.route('/<int:method_id>', methods=['GET'])
 @require_auth
@@ -23,7 +31,7 @@ def get_payment_method(method_id):
 @payment_methods.route('/', methods=['POST'])
 @require_auth
 def create_payment_method():
-    user = get_current_user()
+    user_id = get_current_user_id()
     data = request.get_json()
 
     required_fields = ['card_number', 'cvv', 'billing_zip', 'exp_month', 'exp_year']
@@ -32,7 +40,7 @@ def create_payment_method():
 
     try:
         new_method = PaymentMethod(
-            user_id=user.id,
+            user_id=user_id,
             card_number=data['card_number'],
             cvv=data['cvv'],
             billing_zip=data['billing_zip'],
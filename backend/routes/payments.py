@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from models import Payment, db
-from routes.auth import require_auth, get_current_user, is_authorized
+from routes.auth import require_auth, get_current_user_id, is_authorized
 import logging
 
 payments = Blueprint('payments', __name__)
@@ -8,8 +8,8 @@ payments = Blueprint('payments', __name__)
 @payments.route('/', methods=['GET'])
 @require_auth
 def get_payments():
-    user = get_current_user()
-    payments = Payment.query.filter_by(user_id=user.id).all()
+    user_id = get_current_user_id()
+    payments = Payment.query.filter_by(user_id=user_id).all()
     return jsonify({'payments': [payment.to_dict() for payment in payments]}), 200
 
 @payments.route('/<int:payment_id>', methods=['GET'])
@@ -1,28 +1,57 @@
-from models import Review
+from models import Review, Experience
 from flask import Blueprint, request, jsonify
 from extensions import db
-from datetime import datetime
-from routes.auth import require_auth, require_review_ownership, get_current_user
+from datetime import datetime, timezone
+from routes.auth import require_auth, require_review_ownership, get_current_user_id
+from response_cache import response_cache
+from routes.streaming import ndjson_response, wants_ndjson
 
 reviews_bp = Blueprint('reviews', __name__)
 
-# Get all reviews
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def filter_reviews(statement, args):
+    experience_id = args.get('experience_id', type=int)
+    if experience_id is not None:
+        statement = statement.where(Review.experience_id == experience_id)
+    author_id = args.get('user_id', type=int)
+    if author_id is not None:
+        statement = statement.where(Review.user_id == author_id)
+    return statement
+
+def page_reviews(statement, args):
+    # Newest first, past the cursor, with one extra row to tell whether
+    # another page exists. Returns the statement and the page size.
+    cursor = args.get('cursor', type=int)
+    if cursor:
+        statement = statement.where(Review.id < cursor)
+    limit = max(1, min(args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    return statement.order_by(Review.id.desc()).limit(limit + 1), limit
+
+# Get reviews, newest first, optionally for one experience or one author
 @reviews_bp.route('/', methods=['GET'])
 def get_reviews():
-    reviews = Review.query.all()
-    user = get_current_user()
-    user_id = user.id if user else None
+    user_id = get_current_user_id()
+    statement = filter_reviews(Review.list_query(), request.args)
+
+    if wants_ndjson():
+        return ndjson_response(statement.order_by(Review.id), lambda row: Review.row_to_dict(row, user_id))
+
+    statement, limit = page_reviews(statement, request.args)
+    rows = db.session.execute(statement).all()
+    page = rows[:limit]
 
     return jsonify({
-        "reviews": [review.to_dict(user_id) for review in reviews]
+        "reviews": [Review.row_to_dict(row, user_id) for row in page],
+        "next_cursor": page[-1].id if len(rows) > limit else None
     })
 
 # Get a specific review
 @reviews_bp.route('/<int:review_id>', methods=['GET'])
 def get_review(review_id):
     review = Review.query.get_or_404(review_id)
-    user = get_current_user()
-    user_id = user.id if user else None
+    user_id = get_current_user_id()
 
     return jsonify(review.to_dict(user_id))
 
@@ -30,7 +59,7 @@ def get_review(review_id):
 @reviews_bp.route('/', methods=['POST'])
 @require_auth
 def create_review():
-    user = get_current_user()
+    user_id = get_current_user_id()
     data = request.get_json()
 
     # Check all required fields
@@ -44,16 +73,18 @@ def create_review():
     new_review = Review(
         comment=data['comment'],
         rating=data['rating'],
-        user_id=user.id,
+        user_id=user_id,
         experience_id=data['experience_id'],
-        timestamp=datetime.now(datetime.UTC)
+        timestamp=datetime.now(timezone.utc)
     )
 
     try:
         db.session.add(new_review)
+        Experience.adjust_rating(new_review.experience_id, 1, new_review.rating)
+        response_cache.invalidate_experience(new_review.experience_id)
         db.session.commit()
 
-        return jsonify(new_review.to_dict(user.id)), 201
+        return jsonify(new_review.to_dict(user_id)), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "Failed to create review"}), 500
@@ -65,19 +96,24 @@ def create_review():
 def update_review(review_id):
     review = Review.query.get_or_404(review_id)
     data = request.get_json()
-    user = get_current_user()
+    user_id = get_current_user_id()
 
     # Update provided fields
     if 'comment' in data:
         review.comment = data['comment']
+    rating_delta = 0
     if 'rating' in data:
         if not 1 <= data['rating'] <= 5:
             return jsonify({"error": "Rating must be between 1 and 5"}), 400
+        rating_delta = data['rating'] - review.rating
         review.rating = data['rating']
 
     try:
+        if rating_delta:
+            Experience.adjust_rating(review.experience_id, 0, rating_delta)
+        response_cache.invalidate_experience(review.experience_id)
         db.session.commit()
-        return jsonify(review.to_dict(user.id))
+        return jsonify(review.to_dict(user_id))
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "Failed to update review"}), 500
@@ -91,6 +127,8 @@ def delete_review(review_id):
 
     try:
         db.session.delete(review)
+        Experience.adjust_rating(review.experience_id, -1, -review.rating)
+        response_cache.invalidate_experience(review.experience_id)
         db.session.commit()
         return jsonify({"message": "Review deleted successfully"})
     except Exception as e:
@@ -3,9 +3,14 @@ from flask import Blueprint, request, jsonify
 from extensions import db
 from datetime import datetime
 from routes.auth import require_admin
+from response_cache import response_cache
 
 schedules = Blueprint('schedules', __name__)
 
+def valid_capacity(capacity):
+    # None means unlimited. bool is an int subclass but not a capacity.
+    return capacity is None or (isinstance(capacity, int) and not isinstance(capacity, bool) and capacity >= 0)
+
 # Get all schedules for an experience
 @schedules.route('/<int:experience_id>/schedules', methods=['GET'])
 def get_experience_schedules(experience_id):
@@ -35,6 +40,8 @@ def add_experience_schedules(experience_id):
             required_fields = ['start_date', 'start_time', 'end_time', 'days_of_week']
             if not all(field in schedule_data for field in required_fields):
                 return jsonify({'error': 'Missing required fields'}), 400
+            if not valid_capacity(schedule_data.get('capacity')):
+                return jsonify({'error': 'capacity must be a non-negative integer or null'}), 400
 
             new_schedule = ExperienceSchedule(
                 experience_id=experience_id,
@@ -43,11 +50,13 @@ def add_experience_schedules(experience_id):
                 recurring_pattern=schedule_data.get('recurring_pattern'),
                 days_of_week=schedule_data['days_of_week'],
                 start_time=datetime.fromisoformat(schedule_data['start_time']).time(),
-                end_time=datetime.fromisoformat(schedule_data['end_time']).time()
+                end_time=datetime.fromisoformat(schedule_data['end_time']).time(),
+                capacity=schedule_data.get('capacity')
             )
             new_schedules.append(new_schedule)
 
         db.session.add_all(new_schedules)
+        response_cache.invalidate_experience(experience_id)
         db.session.commit()
 
         return jsonify({
@@ -71,6 +80,8 @@ def update_experience_schedules(experience_id):
         for schedule_data in data:
             if 'id' not in schedule_data:
                 return jsonify({'error': 'Each schedule must have an id'}), 400
+            if not valid_capacity(schedule_data.get('capacity')):
+                return jsonify({'error': 'capacity must be a non-negative integer or null'}), 400
 
             schedule = ExperienceSchedule.query.filter_by(
                 id=schedule_data['id'],
@@ -89,9 +100,12 @@ def update_experience_schedules(experience_id):
                 schedule.start_time = datetime.fromisoformat(schedule_data['start_time']).time()
             if 'end_time' in schedule_data:
                 schedule.end_time = datetime.fromisoformat(schedule_data['end_time']).time()
+            if 'capacity' in schedule_data:
+                schedule.capacity = schedule_data['capacity']
 
             updated_schedules.append(schedule)
 
+        response_cache.invalidate_experience(experience_id)
         db.session.commit()
 
         return jsonify({
@@ -120,6 +134,7 @@ def delete_experience_schedules(experience_id):
         for schedule in schedules:
             db.session.delete(schedule)
 
+        response_cache.invalidate_experience(experience_id)
         db.session.commit()
         return jsonify({'message': f'Successfully deleted {len(schedules)} schedules'}), 200
     except Exception as e:
@@ -0,0 +1,25 @@
+from flask import Response, current_app, jsonify, request, stream_with_context
+from extensions import db
+from routes.auth import is_admin
+
+# Rows fetched per round trip while streaming; only this many are held in
+# memory at once
+NDJSON_BATCH_SIZE = 500
+
+def wants_ndjson():
+    return request.args.get('format') == 'ndjson'
+
+def ndjson_response(statement, serialize):
+    # Full exports are admin-only. Rows come off a server-side cursor
+    # (yield_per) and each is written as one JSON line as soon as it's read,
+    # so memory stays flat and the first bytes go out right away.
+    if not is_admin():
+        return jsonify({'error': 'Admin access required for ndjson export'}), 403
+
+    dumps = current_app.json.dumps
+
+    def generate():
+        for row in db.session.execute(statement.execution_options(yield_per=NDJSON_BATCH_SIZE)):
+            yield dumps(serialize(row)) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -2,11 +2,13 @@ from models import Tag
 from flask import Blueprint, request, jsonify
 from extensions import db
 from datetime import datetime
+from response_cache import response_cache
 
 tags = Blueprint('tags', __name__)
 
 # Get all tags
 @tags.route('/', methods=['GET'])
+@response_cache.cached('tags')
 def get_tags():
     tags = Tag.query.all()
 
@@ -0,0 +1,218 @@
+import logging
+import os
+import time
+from threading import Lock, Thread
+from sqlalchemy import event, func, select, true, update
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Booking, Experience, ExperienceImage, ExperienceSchedule, Payment, PaymentMethod, Reservation, Review, Tag, User
+
+VERSIONED_MODELS = (Experience, Booking, PaymentMethod, Tag, User)
+
+def versioned_parent(instance):
+    # The versioned row whose responses show this instance, as (model, id)
+    if isinstance(instance, VERSIONED_MODELS):
+        return type(instance), instance.id
+    if isinstance(instance, (ExperienceImage, ExperienceSchedule, Review)):
+        return Experience, instance.experience_id
+    if isinstance(instance, (Reservation, Payment)):
+        return Booking, instance.booking_id
+    return None
+
+def bump_versions(session, model, ids):
+    if ids:
+        if model is Experience:
+            session.info.setdefault('catalog_changed', (set(), set()))[0].update(ids)
+        session.connection().execute(
+            update(model)
+            .where(model.id.in_(ids))
+            .values(version=model.version + 1)
+        )
+
+# Every flushed change bumps the version of the row it belongs to, in the same
+# transaction. Bulk statements don't flush, so their callers use bump_versions.
+@event.listens_for(Session, 'after_flush')
+def bump_changed_versions(session, flush_context):
+    changed = {}
+    touched = [instance for instance in session.dirty if session.is_modified(instance)]
+    # New or deleted versioned rows have nothing cached against them; only
+    # their parents need bumping
+    touched += [instance for instance in list(session.new) + list(session.deleted)
+                if not isinstance(instance, VERSIONED_MODELS)]
+
+    for instance in touched:
+        parent = versioned_parent(instance)
+        if parent and parent[1] is not None:
+            changed.setdefault(parent[0], set()).add(parent[1])
+
+    for model, ids in changed.items():
+        bump_versions(session, model, ids)
+
+
+def version_columns(model):
+    return (
+        func.count(model.id).label('count'),
+        func.max(model.id).label('max_id'),
+        func.coalesce(func.sum(model.version), 0).label('versions')
+    )
+
+def table_version(session, model):
+    # Moves whenever a row is added, deleted or has its version bumped, by any
+    # process, so it can be compared across workers
+    return tuple(session.execute(select(*version_columns(model))).one())
+
+def shown_version(session, experience_ids=None):
+    # Tag names show in every experience response and, given experience ids,
+    # their reviewers' names show with the reviews. Neither bumps the
+    # experiences' versions, so their ETags also read this: table_version(Tag)
+    # plus the reviewers' versions, in one query.
+    tags = select(*version_columns(Tag)).subquery()
+    if experience_ids is None:
+        return tuple(session.execute(select(tags)).one())
+    reviewers = (
+        select(func.count(Review.id).label('reviews'), func.coalesce(func.sum(User.version), 0).label('reviewer_versions'))
+        .join(User, User.id == Review.user_id)
+        .where(Review.experience_id.in_(experience_ids))
+        .subquery()
+    )
+    return tuple(session.execute(select(tags, reviewers).select_from(tags.join(reviewers, true()))).one())
+
+
+class Poller:
+    """Runs task() in an app context every `interval` seconds on a daemon
+    thread. start() is cheap enough to call from every request: the thread is
+    started once per process, so a forked worker starts its own instead of
+    relying on the parent's, which didn't survive the fork. With first the
+    task also runs as soon as the thread starts."""
+
+    def __init__(self, task, name, first=False):
+        self.task = task
+        self.name = name
+        self.first = first
+        self.lock = Lock()
+        self.pid = None
+
+    def start(self, app, interval):
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            Thread(target=self.run, args=(app, interval), name=self.name, daemon=True).start()
+
+    def run(self, app, interval):
+        wait = 0 if self.first else interval
+        while True:
+            time.sleep(wait)
+            wait = interval
+            try:
+                with app.app_context():
+                    self.task()
+            except Exception as e:
+                logging.error(f"{self.name} failed: {e}")
+
+
+class CatalogWatcher:
+    """Finds experiences (and, with tags, tags) changed outside this process:
+    by another worker, a seed script or a bulk load, none of which reach this
+    process's session hooks. Rows this process committed itself are skipped,
+    since its own hooks have already applied them.
+
+    watch() polls on a daemon thread and hands what changed to
+    on_change(experience_ids, tag_ids) there, so requests never wait on it.
+    Each poll compares the experiences table_version with the last one and
+    only reads the per-row versions when it moved."""
+
+    def __init__(self, on_change, name, tags=False):
+        self.on_change = on_change
+        self.tags = tags
+        self.lock = Lock()
+        self.summary = None
+        self.versions = {}
+        self.tag_names = {}
+        self.local = (set(), set())
+        # Polls straight away, so changes are caught from the moment it starts
+        self.poller = Poller(self.check, name, first=True)
+        watchers.append(self)
+
+    def watch(self, app, interval):
+        self.poller.start(app, interval)
+
+    def read(self, session):
+        summary = table_version(session, Experience)
+        versions = self.versions
+        if summary != self.summary:
+            versions = dict(session.execute(select(Experience.id, Experience.version)).all())
+        tag_names = dict(session.execute(select(Tag.id, Tag.name)).all()) if self.tags else {}
+        return summary, versions, tag_names
+
+    def reset(self, session):
+        # Call before loading a rebuild. Local commits after this point are
+        # reported by the next poll, since the rebuild may not include them.
+        summary, versions, tag_names = self.read(session)
+        with self.lock:
+            self.summary, self.versions, self.tag_names = summary, versions, tag_names
+            self.local = (set(), set())
+
+    def forget_local(self):
+        # Call when a rebuild replaces the structure local commits were
+        # applied to, so the next poll reports them again
+        with self.lock:
+            self.local = (set(), set())
+
+    def note_local(self, experience_ids, tag_ids):
+        with self.lock:
+            self.local[0].update(experience_ids)
+            self.local[1].update(tag_ids)
+
+    def poll(self, session):
+        summary, versions, tag_names = self.read(session)
+        with self.lock:
+            first = self.summary is None
+            local_experiences, local_tags = self.local
+            self.local = (set(), set())
+            experience_ids = {
+                experience_id for experience_id in versions.keys() | self.versions.keys()
+                if versions.get(experience_id) != self.versions.get(experience_id)
+            } - local_experiences
+            tag_ids = {
+                tag_id for tag_id in tag_names.keys() | self.tag_names.keys()
+                if tag_names.get(tag_id) != self.tag_names.get(tag_id)
+            } - local_tags
+            self.summary, self.versions, self.tag_names = summary, versions, tag_names
+        # The first read only takes the snapshot
+        return (set(), set()) if first else (experience_ids, tag_ids)
+
+    def check(self):
+        with Session(db.engine) as session:
+            experience_ids, tag_ids = self.poll(session)
+        if experience_ids or tag_ids:
+            self.on_change(experience_ids, tag_ids)
+
+
+watchers = []
+
+# Experiences and tags committed through this process's ORM, which its own
+# hooks keep the in-memory structures current with. The watchers skip them.
+@event.listens_for(Session, 'after_flush')
+def collect_catalog_changes(session, flush_context):
+    experience_ids, tag_ids = session.info.setdefault('catalog_changed', (set(), set()))
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, Tag):
+            tag_ids.add(instance.id)
+        else:
+            parent = versioned_parent(instance)
+            if parent and parent[0] is Experience and parent[1] is not None:
+                experience_ids.add(parent[1])
+
+@event.listens_for(Session, 'after_commit')
+def note_catalog_changes(session):
+    experience_ids, tag_ids = session.info.pop('catalog_changed', (set(), set()))
+    if experience_ids or tag_ids:
+        for watcher in watchers:
+            watcher.note_local(experience_ids, tag_ids)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_catalog_changes(session):
+    session.info.pop('catalog_changed', None)
@@ -0,0 +1,247 @@
+from bisect import bisect_left, insort
+from collections import Counter
+from threading import Lock
+from fuzzywuzzy import fuzz, utils
+from sqlalchemy import event
+from sqlalchemy.orm import Session, selectinload
+from extensions import db
+from models import Experience, ExperienceImage, Tag
+from row_versions import CatalogWatcher
+
+# Fields scored against the query, in the order used to break score ties
+SEARCH_FIELDS = ('title', 'tags', 'location', 'description')
+
+MIN_MATCH_SCORE = 60
+MAX_CANDIDATES = 50
+# Trigrams shared by more than this share of the catalog say little about a
+# match, so they are skipped whenever the query has rarer ones to go on
+COMMON_TRIGRAM_RATIO = 0.1
+
+def normalize(text):
+    return utils.full_process(text or '')
+
+def trigrams(text):
+    # Each word is padded the same way pg_trgm does it, so short queries still
+    # produce trigrams that line up with the start of indexed words
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+def index_document(documents, postings, document):
+    documents[document['id']] = document
+    for gram in trigrams(' '.join(document['fields'].values())):
+        postings.setdefault(gram, set()).add(document['id'])
+
+
+class SearchIndex:
+    """Trigram index over experience titles, descriptions, locations and tag
+    names. Candidates come from the trigram postings and only those get the
+    precise fuzzy score, so a lookup never walks the whole catalog.
+
+    Commits in this process update the affected documents in place. Writes
+    from elsewhere are found by a background watcher and applied the same
+    way, so no request ever waits on a rebuild."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.documents = {}
+        self.postings = {}
+        # (title, id) pairs kept sorted so suggestions come out in title order
+        self.titles = []
+        self.built = False
+        self.changes = CatalogWatcher(self.apply_remote, 'search index watcher', tags=True)
+
+    def build(self):
+        # Indexes into fresh structures and swaps them in, so searches keep
+        # being served from the old ones meanwhile
+        with Session(db.engine) as session:
+            self.changes.reset(session)
+            experiences = session.query(Experience).options(
+                selectinload(Experience.images),
+                selectinload(Experience.tags)
+            ).all()
+            documents = [self.make_document(experience) for experience in experiences]
+
+        indexed, postings = {}, {}
+        for document in documents:
+            index_document(indexed, postings, document)
+        titles = sorted((document['title'], doc_id) for doc_id, document in indexed.items())
+
+        with self.lock:
+            self.documents, self.postings, self.titles = indexed, postings, titles
+            self.built = True
+            self.changes.forget_local()
+
+    def watch(self, app):
+        # The commit hooks below only see this process's writes. Other
+        # workers, seed.py and bulk loads are picked up in the background.
+        if self.built:
+            self.changes.watch(app, app.config['SEARCH_INDEX_CHECK_SECONDS'])
+
+    def apply_remote(self, experience_ids, tag_ids):
+        # Runs on the watcher thread
+        self.refresh(experience_ids | self.tagged(tag_ids))
+
+    def tagged(self, tag_ids):
+        # Documents listing any of the tags, whose tag field a rename or
+        # delete changes
+        if not tag_ids:
+            return set()
+        with self.lock:
+            return {doc_id for doc_id, document in self.documents.items() if document['tag_ids'] & tag_ids}
+
+    def refresh(self, experience_ids):
+        # Loads in its own session: this runs from the after_commit hook where
+        # the request's session can't be used to query
+        if not experience_ids:
+            return
+        with Session(db.engine) as session:
+            experiences = session.query(Experience).options(
+                selectinload(Experience.images),
+                selectinload(Experience.tags)
+            ).filter(Experience.id.in_(experience_ids)).all()
+            documents = [self.make_document(experience) for experience in experiences]
+
+        with self.lock:
+            for experience_id in experience_ids:
+                self._remove(experience_id)
+            for document in documents:
+                self._add(document)
+
+    def make_document(self, experience):
+        return {
+            'id': experience.id,
+            'title': experience.title,
+            'description': experience.description,
+            'location': experience.location,
+            'price': float(experience.price) if experience.price else None,
+            'image_url': experience.images[0].image_url if experience.images else None,
+            'tag_ids': {tag.id for tag in experience.tags},
+            'fields': {
+                'title': normalize(experience.title),
+                'tags': normalize(' '.join(tag.name for tag in experience.tags)),
+                'location': normalize(experience.location),
+                'description': normalize(experience.description),
+            }
+        }
+
+    def _add(self, document):
+        index_document(self.documents, self.postings, document)
+        insort(self.titles, (document['title'], document['id']))
+
+    def _remove(self, experience_id):
+        document = self.documents.pop(experience_id, None)
+        if not document:
+            return
+        del self.titles[bisect_left(self.titles, (document['title'], experience_id))]
+        for gram in trigrams(' '.join(document['fields'].values())):
+            ids = self.postings.get(gram)
+            if ids:
+                ids.discard(experience_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def candidates(self, query):
+        grams = trigrams(query)
+        postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        common = max(len(self.documents) * COMMON_TRIGRAM_RATIO, MAX_CANDIDATES)
+        selective = [ids for ids in postings if len(ids) <= common] or postings[:1]
+
+        counts = Counter()
+        for ids in selective:
+            counts.update(ids)
+
+        # Require a third of the query's trigrams before paying for a fuzzy score
+        needed = max(1, len(selective) // 3)
+        return [doc_id for doc_id, hits in counts.most_common(MAX_CANDIDATES) if hits >= needed]
+
+    def search(self, query, limit=10):
+        query = normalize(query)
+        if not query:
+            return []
+
+        with self.lock:
+            documents = [self.documents[doc_id] for doc_id in self.candidates(query)]
+
+        matches = []
+        for document in documents:
+            score, match_type = 0, None
+            for field in SEARCH_FIELDS:
+                text = document['fields'][field]
+                if text:
+                    field_score = fuzz.partial_ratio(query, text)
+                    if field_score > score:
+                        score, match_type = field_score, field
+
+            if score >= MIN_MATCH_SCORE:
+                matches.append({
+                    'id': document['id'],
+                    'title': document['title'],
+                    'description': document['description'],
+                    'location': document['location'],
+                    'price': document['price'],
+                    'match_score': score,
+                    'match_type': match_type,
+                    'image_url': document['image_url']
+                })
+
+        matches.sort(key=lambda x: x['match_score'], reverse=True)
+        return matches[:limit]
+
+    def suggestions(self, query, limit=5):
+        query = query.lower()
+        normalized = normalize(query)
+        suggestions = []
+
+        with self.lock:
+            # A title containing the query contains every trigram inside each
+            # query word, so intersecting those postings narrows the scan
+            inner = [word[i:i + 3] for word in normalized.split() for i in range(len(word) - 2)]
+            ids = set.intersection(*(self.postings.get(gram, set()) for gram in inner)) if inner else None
+
+            if ids is not None and len(ids) < len(self.titles) * COMMON_TRIGRAM_RATIO:
+                titles = sorted((self.documents[doc_id]['title'], doc_id) for doc_id in ids)
+            else:
+                titles = self.titles
+
+            # Titles are walked in order, so the scan stops at the first few hits
+            for title, doc_id in titles:
+                if query in title.lower():
+                    suggestions.append({'id': doc_id, 'title': title})
+                    if len(suggestions) == limit:
+                        break
+
+        return suggestions
+
+
+search_index = SearchIndex()
+
+# Keep the index in step with this process's committed changes. Touched
+# experience ids are collected on flush and only applied once the transaction
+# commits. A renamed or deleted tag refreshes the documents listing it.
+@event.listens_for(Session, 'after_flush')
+def collect_changed_experiences(session, flush_context):
+    changed = session.info.setdefault('search_index_changed', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, Experience):
+            changed.add(instance.id)
+        elif isinstance(instance, ExperienceImage):
+            changed.add(instance.experience_id)
+        elif isinstance(instance, Tag) and instance not in session.new:
+            session.info.setdefault('search_index_tags', set()).add(instance.id)
+
+@event.listens_for(Session, 'after_commit')
+def apply_changed_experiences(session):
+    changed = session.info.pop('search_index_changed', set())
+    tag_ids = session.info.pop('search_index_tags', set())
+    # Nothing to keep in step when another search backend is serving /search
+    if search_index.built:
+        search_index.refresh(changed | search_index.tagged(tag_ids))
+
+@event.listens_for(Session, 'after_rollback')
+def discard_changed_experiences(session):
+    session.info.pop('search_index_changed', None)
+    session.info.pop('search_index_tags', None)
@@ -0,0 +1,78 @@
+import re
+from sqlalchemy import func, literal_column, or_, select
+from extensions import db
+from models import Experience, ExperienceImage
+
+# Generated tsvector column added by the search migration; it isn't mapped on
+# the model because SQLite has no equivalent
+search_vector = literal_column('experiences.search_vector')
+
+
+class PostgresSearch:
+    """Search backend that matches in Postgres: a prefix tsquery against the
+    GIN-indexed search_vector plus pg_trgm word similarity on the title.
+    Returns the same shapes as the in-memory SearchIndex."""
+
+    def tsquery(self, query):
+        # Every word is matched as a prefix so partially typed words still hit
+        words = re.findall(r'\w+', query.lower())
+        if not words:
+            return None
+        return func.to_tsquery('english', ' & '.join(f"{word}:*" for word in words))
+
+    def search(self, query, limit=10):
+        tsquery = self.tsquery(query)
+        if tsquery is None:
+            return []
+
+        title_score = func.word_similarity(query, Experience.title)
+        # Normalization 32 scales the rank into 0..1 so it compares with similarity
+        text_score = func.ts_rank_cd(search_vector, tsquery, 32)
+        first_image = (
+            select(ExperienceImage.image_url)
+            .where(ExperienceImage.experience_id == Experience.id)
+            .order_by(ExperienceImage.id)
+            .limit(1)
+            .scalar_subquery()
+        )
+
+        rows = db.session.execute(
+            select(
+                Experience.id,
+                Experience.title,
+                Experience.description,
+                Experience.location,
+                Experience.price,
+                first_image.label('image_url'),
+                title_score.label('title_score'),
+                text_score.label('text_score')
+            )
+            .where(or_(search_vector.op('@@')(tsquery), Experience.title.op('%>')(query)))
+            .order_by(func.greatest(title_score, text_score).desc(), Experience.id)
+            .limit(limit)
+        ).all()
+
+        return [{
+            'id': row.id,
+            'title': row.title,
+            'description': row.description,
+            'location': row.location,
+            'price': float(row.price) if row.price else None,
+            'match_score': round(max(row.title_score, row.text_score) * 100),
+            'match_type': 'title' if row.title_score >= row.text_score else 'description',
+            'image_url': row.image_url
+        } for row in rows]
+
+    def suggestions(self, query, limit=5):
+        # ILIKE is served by the gin_trgm_ops index on the title
+        rows = db.session.execute(
+            select(Experience.id, Experience.title)
+            .where(Experience.title.icontains(query, autoescape=True))
+            .order_by(Experience.title)
+            .limit(limit)
+        ).all()
+
+        return [{'id': row.id, 'title': row.title} for row in rows]
+
+
+postgres_search = PostgresSearch()
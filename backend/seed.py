@@ -2,7 +2,9 @@ from seed_data import users, payment_methods, referrals, bundles, experiences, e
 from extensions import db
 from app import app
 from models import *
+from bulk_load import bulk_load, object_rows
 from sqlalchemy import text
+from flask_migrate import upgrade
 
 # Use the application context
 with app.app_context():
@@ -23,6 +25,9 @@ with app.app_context():
     db.session.execute(text("DROP TABLE IF EXISTS bundles CASCADE;"))
     db.session.execute(text("DROP TABLE IF EXISTS experiences CASCADE;"))
     db.session.execute(text("DROP TABLE IF EXISTS users CASCADE;"))
+
+    # Forget applied migrations too, they get re-run on the fresh tables below
+    db.session.execute(text("DROP TABLE IF EXISTS alembic_version;"))
     
     db.session.commit()
 
@@ -30,37 +35,33 @@ with app.app_context():
     # Create all tables in the proper order
     db.create_all()
     
-    # Add all data
-    db.session.add_all(users)
-    db.session.add_all(payment_methods)
-    db.session.add_all(referrals)
-    db.session.add_all(tags)
-    db.session.add_all(experiences)  
-    db.session.add_all(bundles)
-    db.session.add_all(experience_images)
-    db.session.add_all(experience_schedules)
-    db.session.add_all(bookings)
-    db.session.add_all(reservations)
-    db.session.add_all(reviews)
-    db.session.add_all(payments)
-    
-    # Commit to save the base entities
-    db.session.commit()
-    
-    # Add junction table relationships
-    for exp_tag in experience_tags:
-        db.session.execute(experience_tag.insert().values(
-            tag_id=exp_tag['tag_id'],
-            experience_id=exp_tag['experience_id']
-        ))
-    
-    for bundle_exp in bundle_experiences:
-        db.session.execute(bundle_experience.insert().values(
-            bundle_id=bundle_exp['bundle_id'],
-            experience_id=bundle_exp['experience_id']
-        ))
-    
+    # Stream every table in with COPY (executemany batches on SQLite). Rows
+    # take the ids a fresh table would have given them, which is what the
+    # foreign keys in seed_data assume.
+    bulk_load(db.session, [
+        (User.__table__, object_rows(users)),
+        (PaymentMethod.__table__, object_rows(payment_methods)),
+        (Referral.__table__, object_rows(referrals)),
+        (Tag.__table__, object_rows(tags)),
+        (Experience.__table__, object_rows(experiences)),
+        (Bundle.__table__, object_rows(bundles)),
+        (ExperienceImage.__table__, object_rows(experience_images)),
+        (ExperienceSchedule.__table__, object_rows(experience_schedules)),
+        (Booking.__table__, object_rows(bookings)),
+        (Reservation.__table__, object_rows(reservations)),
+        (Review.__table__, object_rows(reviews)),
+        (Payment.__table__, object_rows(payments)),
+        (experience_tag, experience_tags),
+        (bundle_experience, bundle_experiences)
+    ])
+
+    # Build the denormalized rating aggregates from the seeded reviews
+    Experience.refresh_rating_aggregates()
+
     # Commit all changes
     db.session.commit()
+
+    # Apply the migrations that add database-specific objects (search indexes)
+    upgrade()
     
     print("Database seeded successfully!")
\ No newline at end of file
@@ -0,0 +1,198 @@
+from bisect import bisect_left, insort
+from heapq import nsmallest
+from threading import Lock
+from fuzzywuzzy import utils
+from sqlalchemy import and_, event, func, inspect, select
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Booking, Experience
+from row_versions import CatalogWatcher, Poller
+
+# Lookups on prefixes this short match a large slice of the catalog, so their
+# results are cached until the next change to the index
+CACHED_PREFIX_LENGTH = 2
+
+def tokenize(text):
+    return utils.full_process(text or '').split()
+
+def counts_as_booked(status):
+    # Popularity counts bookings that still stand, as availability does
+    return status != 'cancelled'
+
+def popularity_query():
+    return (
+        select(Experience.id, Experience.title, func.count(Booking.id))
+        .outerjoin(Booking, and_(Booking.experience_id == Experience.id, Booking.status != 'cancelled'))
+        .group_by(Experience.id, Experience.title)
+    )
+
+
+class SuggestIndex:
+    """Sorted array of (token, experience id) pairs over normalized title
+    words, with booking counts for ranking. A prefix lookup is a bisect plus a
+    scan of the matching range and never touches the database.
+
+    Title changes from other processes are picked up by a background watcher
+    on the experiences table. Their bookings only move the rankings, so they
+    are allowed to lag until the periodic background rebuild."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.tokens = []
+        self.titles = {}
+        self.popularity = {}
+        self.cache = {}
+        self.changes = CatalogWatcher(self.apply_remote, 'suggest index watcher')
+        self.rebuilder = Poller(self.build, 'suggest index rebuild')
+
+    def build(self):
+        # Loads and sorts outside the lock, then swaps, so lookups keep being
+        # served from the old index while a rebuild runs
+        with Session(db.engine) as session:
+            self.changes.reset(session)
+            rows = session.execute(popularity_query()).all()
+
+        titles = {experience_id: title for experience_id, title, _ in rows}
+        popularity = {experience_id: count for experience_id, _, count in rows}
+        tokens = sorted(
+            (token, experience_id)
+            for experience_id, title in titles.items()
+            for token in set(tokenize(title))
+        )
+        with self.lock:
+            self.titles, self.popularity, self.tokens, self.cache = titles, popularity, tokens, {}
+            self.changes.forget_local()
+
+    def watch(self, app):
+        self.changes.watch(app, app.config['SEARCH_INDEX_CHECK_SECONDS'])
+        self.rebuilder.start(app, app.config['SUGGEST_INDEX_REBUILD_SECONDS'])
+
+    def apply_remote(self, experience_ids, tag_ids):
+        # Runs on the watcher thread
+        with Session(db.engine) as session:
+            rows = session.execute(popularity_query().where(Experience.id.in_(experience_ids))).all()
+        for experience_id, title, count in rows:
+            self.set_title(experience_id, title)
+            with self.lock:
+                self.popularity[experience_id] = count
+                self.cache = {}
+        for experience_id in experience_ids - {row[0] for row in rows}:
+            self.remove(experience_id)
+
+    def set_title(self, experience_id, title):
+        with self.lock:
+            if self.titles.get(experience_id) == title:
+                return
+            self._remove_tokens(experience_id)
+            for token in set(tokenize(title)):
+                insort(self.tokens, (token, experience_id))
+            self.titles[experience_id] = title
+            self.popularity.setdefault(experience_id, 0)
+            self.cache = {}
+
+    def remove(self, experience_id):
+        with self.lock:
+            self._remove_tokens(experience_id)
+            self.titles.pop(experience_id, None)
+            self.popularity.pop(experience_id, None)
+            self.cache = {}
+
+    def add_bookings(self, experience_id, delta):
+        with self.lock:
+            if experience_id in self.popularity:
+                self.popularity[experience_id] = max(0, self.popularity[experience_id] + delta)
+                self.cache = {}
+
+    def _remove_tokens(self, experience_id):
+        title = self.titles.get(experience_id)
+        for token in set(tokenize(title)):
+            i = bisect_left(self.tokens, (token, experience_id))
+            if i < len(self.tokens) and self.tokens[i] == (token, experience_id):
+                del self.tokens[i]
+
+    def _matching(self, prefix):
+        ids = set()
+        i = bisect_left(self.tokens, (prefix,))
+        while i < len(self.tokens) and self.tokens[i][0].startswith(prefix):
+            ids.add(self.tokens[i][1])
+            i += 1
+        return ids
+
+    def suggest(self, query, limit=5):
+        words = tokenize(query)
+        if not words:
+            return []
+
+        key = (words[0], limit)
+        cacheable = len(words) == 1 and len(words[0]) <= CACHED_PREFIX_LENGTH
+
+        with self.lock:
+            if cacheable and key in self.cache:
+                return self.cache[key]
+
+            # Every word is treated as a prefix of some title word; the longest
+            # words narrow the candidates fastest so they go first
+            ids = None
+            for word in sorted(words, key=len, reverse=True):
+                matches = self._matching(word)
+                ids = matches if ids is None else ids & matches
+                if not ids:
+                    break
+
+            top = nsmallest(limit, ids, key=lambda i: (-self.popularity[i], self.titles[i]))
+            suggestions = [{
+                'id': experience_id,
+                'title': self.titles[experience_id],
+                'booking_count': self.popularity[experience_id]
+            } for experience_id in top]
+
+            if cacheable:
+                self.cache[key] = suggestions
+
+        return suggestions
+
+
+suggest_index = SuggestIndex()
+
+# Title and booking changes made through this process's ORM are captured
+# from the flushed objects themselves, so keeping the index current never
+# needs a query. They are held until the transaction commits and dropped if
+# it rolls back.
+@event.listens_for(Session, 'after_flush')
+def collect_suggest_changes(session, flush_context):
+    changes = session.info.setdefault('suggest_index_changes', [])
+    for instance in session.new:
+        if isinstance(instance, Experience):
+            changes.append((suggest_index.set_title, instance.id, instance.title))
+        elif isinstance(instance, Booking) and counts_as_booked(instance.status):
+            changes.append((suggest_index.add_bookings, instance.experience_id, 1))
+    for instance in session.dirty:
+        if isinstance(instance, Experience):
+            changes.append((suggest_index.set_title, instance.id, instance.title))
+        elif isinstance(instance, Booking):
+            # A cancellation (or its reversal) is a status-only update
+            history = inspect(instance).attrs.status.history
+            if history.deleted:
+                delta = counts_as_booked(instance.status) - counts_as_booked(history.deleted[0])
+                if delta:
+                    changes.append((suggest_index.add_bookings, instance.experience_id, delta))
+    for instance in session.deleted:
+        if isinstance(instance, Experience):
+            changes.append((suggest_index.remove, instance.id))
+        elif isinstance(instance, Booking) and counts_as_booked(instance.status):
+            changes.append((suggest_index.add_bookings, instance.experience_id, -1))
+
+# Makes an assignment to an expired status load the old value first, so the
+# flush hook above always has it to compare
+@event.listens_for(Booking.status, 'set', active_history=True)
+def load_previous_status(target, value, oldvalue, initiator):
+    pass
+
+@event.listens_for(Session, 'after_commit')
+def apply_suggest_changes(session):
+    for change, *args in session.info.pop('suggest_index_changes', []):
+        change(*args)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_suggest_changes(session):
+    session.info.pop('suggest_index_changes', None)
@@ -0,0 +1,80 @@
+import os
+import sys
+import tempfile
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+# Set before anything imports extensions, which reads it
+DATABASE_DIR = tempfile.mkdtemp(prefix='speakeasy-tests-')
+config.Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(DATABASE_DIR, 'test.db')}"
+# Tests run the background watchers' checks themselves
+config.Config.SEARCH_INDEX_CHECK_SECONDS = 3600
+config.Config.SUGGEST_INDEX_REBUILD_SECONDS = 3600
+config.Config.RESPONSE_CACHE_CHECK_SECONDS = 3600
+
+from app import app as flask_app
+from benchmarks.synthetic_data import LOAD_TEST_PASSWORD, SyntheticCatalog, load
+from extensions import db
+from models import Experience, ExperienceSchedule
+from search_index import search_index
+from suggest_index import suggest_index
+
+# Big enough that every list endpoint pages, small enough to load in seconds
+CATALOG_COUNTS = {'users': 500, 'experiences': 1000, 'reviews': 20000, 'bookings': 4000}
+
+
+@pytest.fixture(scope='session')
+def app():
+    """The app on a fresh SQLite database holding a synthetic_data.py catalog."""
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        load(SyntheticCatalog(CATALOG_COUNTS, seed=42))
+        # Built at startup, as app.py does
+        suggest_index.build()
+        search_index.build()
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def sign_in(app):
+    """Returns Authorization headers for a synthetic user. Each user signs in
+    once per session; user n pays with payment method n."""
+    tokens = {}
+
+    def headers(user_id):
+        if user_id not in tokens:
+            response = app.test_client().post('/api/login', json={
+                'email': f"loadtest{user_id}@example.com",
+                'password': LOAD_TEST_PASSWORD
+            })
+            tokens[user_id] = response.get_json()['token']
+        return {'Authorization': f"Bearer {tokens[user_id]}"}
+    return headers
+
+
+@pytest.fixture
+def make_experience(app):
+    """Adds an experience with the given schedule fields and returns its id."""
+    def make(**schedule):
+        with app.app_context():
+            experience = Experience(
+                title='Test Experience',
+                location='Testville',
+                price=Decimal('25.00'),
+                schedule=ExperienceSchedule(**schedule)
+            )
+            db.session.add(experience)
+            db.session.commit()
+            return experience.id
+    return make
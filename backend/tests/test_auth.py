@@ -0,0 +1,147 @@
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from sqlalchemy import update
+
+import routes.auth as auth
+from benchmarks.synthetic_data import LOAD_TEST_PASSWORD
+from extensions import db
+from models import User
+from passwords import password_pool
+
+# Users whose tokens these tests revoke, kept apart from the shared sign_in ones
+PASSWORD_USER_ID = 401
+PROMOTED_USER_ID = 402
+OTHER_WORKER_USER_ID = 403
+CACHED_USER_IDS = (404, 405, 406)
+PLAIN_TEXT_USER_ID = 407
+MISSING_EXPERIENCE_ID = 999999
+
+
+def log_in(client, user_id, password=LOAD_TEST_PASSWORD):
+    response = client.post('/api/login', json={'email': f"loadtest{user_id}@example.com", 'password': password})
+    assert response.status_code == 200
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+
+def signed_in(client, headers):
+    return client.get('/bookings/', headers=headers).status_code != 401
+
+
+def admin(client, headers):
+    # Admins get past require_admin to the missing experience
+    status = client.put(f"/experiences/{MISSING_EXPERIENCE_ID}", json={}, headers=headers).status_code
+    assert status in (403, 404)
+    return status == 404
+
+
+def change_user(app, user_id, **values):
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        for name, value in values.items():
+            setattr(user, name, value)
+        db.session.commit()
+
+
+def test_password_change_revokes_old_tokens(app, client):
+    headers = log_in(client, PASSWORD_USER_ID)
+    assert signed_in(client, headers)
+
+    change_user(app, PASSWORD_USER_ID, password_hash=password_pool.hash('new-password'))
+
+    assert not signed_in(client, headers)
+    assert signed_in(client, log_in(client, PASSWORD_USER_ID, 'new-password'))
+
+
+def test_admin_flag_flip_revokes_old_tokens(app, client):
+    headers = log_in(client, PROMOTED_USER_ID)
+    assert not admin(client, headers)
+
+    change_user(app, PROMOTED_USER_ID, admin=True)
+    assert not signed_in(client, headers)
+    headers = log_in(client, PROMOTED_USER_ID)
+    assert admin(client, headers)
+
+    change_user(app, PROMOTED_USER_ID, admin=False)
+    assert not signed_in(client, headers)
+    assert not admin(client, headers)
+    assert not admin(client, log_in(client, PROMOTED_USER_ID))
+
+
+def test_other_workers_revocations_apply_after_the_user_state_ttl(app, client, monkeypatch):
+    headers = log_in(client, OTHER_WORKER_USER_ID)
+    assert signed_in(client, headers)
+
+    # Another worker's revocation, committed without this process's session hooks
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(User).where(User.id == OTHER_WORKER_USER_ID).values(token_generation=User.token_generation + 1)
+            )
+
+    assert signed_in(client, headers)
+    later = time.time() + auth.USER_STATE_TTL_SECONDS + 1
+    monkeypatch.setattr(auth, 'time', SimpleNamespace(time=lambda: later))
+    assert not signed_in(client, headers)
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Counts signature checks, starting from an empty verified-token cache."""
+    calls = []
+
+    def decode(*args, **kwargs):
+        calls.append(args[0])
+        return jwt.decode(*args, **kwargs)
+    monkeypatch.setattr(auth, 'jwt', SimpleNamespace(
+        decode=decode, ExpiredSignatureError=jwt.ExpiredSignatureError, InvalidTokenError=jwt.InvalidTokenError
+    ))
+    monkeypatch.setattr(auth, 'verified_tokens', auth.OrderedDict())
+    return calls
+
+
+def test_verified_tokens_skip_the_signature_check(client, decodes):
+    headers = log_in(client, CACHED_USER_IDS[0])
+
+    assert signed_in(client, headers)
+    assert signed_in(client, headers)
+    assert len(decodes) == 1
+
+
+def test_verified_token_cache_drops_least_recently_used(client, decodes, monkeypatch):
+    monkeypatch.setattr(auth, 'TOKEN_CACHE_SIZE', 2)
+    first, second, third = (log_in(client, user_id) for user_id in CACHED_USER_IDS)
+
+    for headers in (first, second, first, third):
+        assert signed_in(client, headers)
+    # second was least recently used when third came in
+    assert len(decodes) == 3
+    assert signed_in(client, first)
+    assert len(decodes) == 3
+    assert signed_in(client, second)
+    assert len(decodes) == 4
+
+
+def test_verified_tokens_are_not_kept_past_their_expiry(client, decodes):
+    headers = log_in(client, CACHED_USER_IDS[0])
+    assert signed_in(client, headers)
+
+    token = headers['Authorization'].split(' ')[1]
+    expires_at, payload = auth.verified_tokens[token]
+    assert expires_at <= min(time.time() + auth.TOKEN_CACHE_TTL_SECONDS, payload['exp'])
+
+
+def test_tampered_tokens_are_rejected(client):
+    headers = log_in(client, CACHED_USER_IDS[0])
+    assert not signed_in(client, {'Authorization': headers['Authorization'][:-2] + 'xx'})
+
+
+def test_plain_text_passwords_are_not_accepted(app, client):
+    change_user(app, PLAIN_TEXT_USER_ID, password_hash='plain-text-password')
+
+    response = client.post('/api/login', json={
+        'email': f"loadtest{PLAIN_TEXT_USER_ID}@example.com", 'password': 'plain-text-password'
+    })
+    assert response.status_code == 401
@@ -0,0 +1,117 @@
+from datetime import date, timedelta
+
+import pytest
+
+from availability import expand_schedule
+from models import ExperienceSchedule
+
+USER_ID = 12
+
+
+def schedule(**fields):
+    return ExperienceSchedule(**fields)
+
+
+def test_one_off_runs_only_on_its_date():
+    one_off = schedule(recurring_pattern='None', start_date=date(2026, 5, 10))
+
+    assert expand_schedule(one_off, date(2026, 5, 1), date(2026, 5, 31)) == [date(2026, 5, 10)]
+    assert expand_schedule(one_off, date(2026, 5, 10), date(2026, 5, 10)) == [date(2026, 5, 10)]
+    assert expand_schedule(one_off, date(2026, 5, 11), date(2026, 5, 31)) == []
+    assert expand_schedule(schedule(recurring_pattern='None', start_date=None), date(2026, 5, 1), date(2026, 5, 31)) == []
+
+
+def test_weekly_runs_on_listed_days():
+    weekly = schedule(recurring_pattern='Weekly', start_date=date(2026, 1, 1), days_of_week='Monday, wednesday, Funday')
+
+    dates = expand_schedule(weekly, date(2026, 6, 1), date(2026, 6, 14))
+
+    assert dates == [date(2026, 6, 1), date(2026, 6, 3), date(2026, 6, 8), date(2026, 6, 10)]
+
+
+def test_monthly_falls_back_to_the_last_day_of_short_months():
+    monthly = schedule(recurring_pattern='Monthly', start_date=date(2026, 1, 31))
+
+    dates = expand_schedule(monthly, date(2026, 1, 1), date(2026, 4, 30))
+
+    assert dates == [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30)]
+
+
+@pytest.mark.parametrize('pattern', ['Daily', 'Custom', None])
+def test_recurring_is_clipped_to_schedule_and_window(pattern):
+    daily = schedule(recurring_pattern=pattern, start_date=date(2026, 3, 5), end_date=date(2026, 3, 8))
+
+    assert expand_schedule(daily, date(2026, 3, 1), date(2026, 3, 31)) == [
+        date(2026, 3, 5), date(2026, 3, 6), date(2026, 3, 7), date(2026, 3, 8)
+    ]
+    assert expand_schedule(daily, date(2026, 3, 6), date(2026, 3, 7)) == [date(2026, 3, 6), date(2026, 3, 7)]
+    assert expand_schedule(daily, date(2026, 3, 9), date(2026, 3, 31)) == []
+
+
+def book(client, headers, experience_id, guests, day):
+    return client.post('/bookings/', headers=headers, json={
+        'experience_id': experience_id,
+        'number_of_guests': guests,
+        'payment_method_id': USER_ID,
+        'reservations': [{'date': f"{day}T18:00:00", 'time_slot': f"{day}T18:00:00"}]
+    })
+
+
+def slot(client, experience_id, day):
+    slots = client.get(f"/experiences/{experience_id}/availability?from={day}&to={day}").get_json()['slots']
+    assert len(slots) == 1
+    return slots[0]
+
+
+def test_bookings_fill_capacity_and_refresh_availability(client, sign_in, make_experience):
+    experience_id = make_experience(capacity=5)
+    day = date.today() + timedelta(days=5)
+    headers = sign_in(USER_ID)
+    # Loaded into the availability cache before any booking exists
+    assert slot(client, experience_id, day)['available'] == 5
+
+    assert book(client, headers, experience_id, 2, day).status_code == 201
+    assert slot(client, experience_id, day) | {'date': None} == {
+        'date': None, 'start_time': None, 'end_time': None, 'capacity': 5, 'booked': 2, 'available': 3
+    }
+
+    refused = book(client, headers, experience_id, 4, day)
+    assert refused.status_code == 409
+    assert refused.get_json()['full_dates'] == [day.isoformat()]
+
+    assert book(client, headers, experience_id, 3, day).status_code == 201
+    assert slot(client, experience_id, day)['available'] == 0
+
+
+def test_resizing_a_booking_discounts_its_own_guests(client, sign_in, make_experience):
+    experience_id = make_experience(capacity=5)
+    day = date.today() + timedelta(days=6)
+    headers = sign_in(USER_ID)
+    booking = book(client, headers, experience_id, 2, day).get_json()
+
+    assert client.put(f"/bookings/{booking['id']}", json={'number_of_guests': 5}, headers=headers).status_code == 200
+    assert slot(client, experience_id, day)['booked'] == 5
+    assert client.put(f"/bookings/{booking['id']}", json={'number_of_guests': 6}, headers=headers).status_code == 409
+
+
+def test_cancelled_bookings_free_their_places(client, sign_in, make_experience):
+    experience_id = make_experience(capacity=2)
+    day = date.today() + timedelta(days=7)
+    headers = sign_in(USER_ID)
+    booking = book(client, headers, experience_id, 2, day).get_json()
+    assert slot(client, experience_id, day)['available'] == 0
+
+    assert client.delete(f"/bookings/{booking['id']}", headers=headers).status_code == 200
+
+    assert slot(client, experience_id, day)['available'] == 2
+    assert book(client, headers, experience_id, 2, day).status_code == 201
+
+
+def test_unlimited_capacity(client, sign_in, make_experience):
+    experience_id = make_experience(capacity=None)
+    day = date.today() + timedelta(days=5)
+
+    assert book(client, sign_in(USER_ID), experience_id, 50, day).status_code == 201
+    assert slot(client, experience_id, day) | {'date': None} == {
+        'date': None, 'start_time': None, 'end_time': None, 'capacity': None, 'booked': 50, 'available': None
+    }
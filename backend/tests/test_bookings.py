@@ -0,0 +1,52 @@
+from datetime import date, timedelta
+
+import pytest
+
+USER_ID = 11
+
+
+def booking(experience_id, guests, day):
+    return {
+        'experience_id': experience_id,
+        'number_of_guests': guests,
+        'payment_method_id': USER_ID,
+        'reservations': [{'date': f"{day}T19:00:00", 'time_slot': f"{day}T19:00:00"}]
+    }
+
+
+@pytest.mark.parametrize('guests', [-5, 0, '2', 2.5, True, None])
+def test_create_rejects_bad_guest_counts(client, sign_in, make_experience, guests):
+    experience_id = make_experience(capacity=3)
+    day = date.today() + timedelta(days=3)
+
+    response = client.post('/bookings/', json=booking(experience_id, guests, day), headers=sign_in(USER_ID))
+
+    assert response.status_code == 400
+    slot = client.get(f"/experiences/{experience_id}/availability?from={day}&to={day}").get_json()['slots'][0]
+    assert slot['booked'] == 0
+
+
+def test_negative_guests_cannot_oversell(client, sign_in, make_experience):
+    experience_id = make_experience(capacity=3)
+    day = date.today() + timedelta(days=3)
+    headers = sign_in(USER_ID)
+
+    assert client.post('/bookings/', json=booking(experience_id, -5, day), headers=headers).status_code == 400
+    assert client.post('/bookings/', json=booking(experience_id, 3, day), headers=headers).status_code == 201
+    full = client.post('/bookings/', json=booking(experience_id, 1, day), headers=headers)
+
+    assert full.status_code == 409
+    assert full.get_json()['full_dates'] == [day.isoformat()]
+
+
+@pytest.mark.parametrize('guests', [-1, 0, '2', False])
+def test_update_rejects_bad_guest_counts(client, sign_in, make_experience, guests):
+    experience_id = make_experience(capacity=3)
+    day = date.today() + timedelta(days=4)
+    headers = sign_in(USER_ID)
+    created = client.post('/bookings/', json=booking(experience_id, 2, day), headers=headers).get_json()
+
+    response = client.put(f"/bookings/{created['id']}", json={'number_of_guests': guests}, headers=headers)
+
+    assert response.status_code == 400
+    assert client.get(f"/bookings/{created['id']}", headers=headers).get_json()['number_of_guests'] == 2
@@ -0,0 +1,96 @@
+import os
+import time
+
+import pytest
+from flask import Blueprint, Flask, jsonify
+from flask_sqlalchemy import SQLAlchemy
+
+from db_routing import PRIMARY_COOKIE, RoutingSession, stick_to_primary
+
+
+@pytest.fixture
+def routed(tmp_path):
+    """A small app wired like extensions.py, on a primary and a replica
+    SQLite database that start out with different rows."""
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(tmp_path, 'primary.db')}",
+        SQLALCHEMY_BINDS={'replica_0': f"sqlite:///{os.path.join(tmp_path, 'replica.db')}"},
+        DB_REPLICA_STICKY_SECONDS=5
+    )
+    db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
+    class Note(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        text = db.Column(db.String(50))
+
+    # experiences is one of READ_BLUEPRINTS, other is not
+    experiences = Blueprint('experiences', __name__)
+    other = Blueprint('other', __name__)
+
+    def list_notes():
+        return jsonify(sorted(note.text for note in Note.query.all()))
+
+    def add_note():
+        db.session.add(Note(text='written'))
+        db.session.commit()
+        return jsonify({}), 201
+
+    for blueprint in (experiences, other):
+        blueprint.add_url_rule('/', view_func=list_notes, methods=['GET'])
+        blueprint.add_url_rule('/', view_func=add_note, methods=['POST'], endpoint='add_note')
+    app.register_blueprint(experiences, url_prefix='/experiences')
+    app.register_blueprint(other, url_prefix='/other')
+    app.after_request(stick_to_primary)
+
+    with app.app_context():
+        for engine, text in ((db.engines[None], 'primary'), (db.engines['replica_0'], 'replica')):
+            db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(Note.__table__.insert(), {'text': text})
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_reads_of_read_only_blueprints_go_to_the_replica(routed):
+    client = routed.test_client()
+
+    assert client.get('/experiences/').get_json() == ['replica']
+    assert client.get('/other/').get_json() == ['primary']
+
+
+def test_writes_go_to_the_primary(routed):
+    client = routed.test_client()
+
+    response = client.post('/experiences/')
+
+    assert response.status_code == 201
+    assert routed.test_client().get('/other/').get_json() == ['primary', 'written']
+    assert routed.test_client().get('/experiences/').get_json() == ['replica']
+
+
+def test_reads_stick_to_the_primary_after_a_write(routed):
+    client = routed.test_client()
+
+    response = client.post('/experiences/')
+
+    assert PRIMARY_COOKIE in response.headers['Set-Cookie']
+    assert client.get('/experiences/').get_json() == ['primary', 'written']
+    # Clients that haven't written keep reading from the replica
+    assert routed.test_client().get('/experiences/').get_json() == ['replica']
+
+    # Once the sticky window has passed reads go back to the replica
+    client.set_cookie(PRIMARY_COOKIE, str(time.time() - 1))
+    assert client.get('/experiences/').get_json() == ['replica']
+
+
+def test_failed_writes_do_not_pin_to_the_primary(routed):
+    client = routed.test_client()
+
+    response = client.put('/experiences/')
+
+    assert response.status_code == 405
+    assert 'Set-Cookie' not in response.headers
+    assert client.get('/experiences/').get_json() == ['replica']
@@ -0,0 +1,86 @@
+from extensions import db
+from models import Experience, Review
+
+BOOKER_ID = 280
+PAGE = '/experiences/?profile={profile}&limit=5'
+
+
+def fetch(client, path, etag=None, headers=None):
+    headers = dict(headers or {})
+    if etag:
+        headers['If-None-Match'] = f'W/"{etag}"'
+    response = client.get(path, headers=headers)
+    return response.status_code, response.get_etag()[0]
+
+
+def first_experience_id(client):
+    return client.get(PAGE.format(profile='card')).get_json()['experiences'][0]['id']
+
+
+def rename_tag_of(app, experience_id, name):
+    with app.app_context():
+        tag = db.session.get(Experience, experience_id).tags[0]
+        tag.name = name
+        db.session.commit()
+
+
+def rename_reviewer_of(app, experience_id, first_name):
+    with app.app_context():
+        review = Review.query.filter_by(experience_id=experience_id).first()
+        review.user.first_name = first_name
+        db.session.commit()
+        return review.user_id
+
+
+def test_unchanged_listing_is_not_modified(client):
+    status, etag = fetch(client, PAGE.format(profile='card'))
+    assert status == 200
+
+    assert fetch(client, PAGE.format(profile='card'), etag)[0] == 304
+
+
+def test_tag_rename_changes_the_listing_etag(app, client):
+    experience_id = first_experience_id(client)
+    _, etag = fetch(client, PAGE.format(profile='card'))
+
+    rename_tag_of(app, experience_id, 'Renamed Listing Tag')
+
+    status, new_etag = fetch(client, PAGE.format(profile='card'), etag)
+    assert status == 200
+    assert new_etag != etag
+    experience = client.get(PAGE.format(profile='card')).get_json()['experiences'][0]
+    assert 'Renamed Listing Tag' in [tag['name'] for tag in experience['tags']]
+
+
+def test_reviewer_rename_changes_the_full_listing_etag(app, client):
+    experiences = client.get(PAGE.format(profile='full')).get_json()['experiences']
+    experience_id = next(experience['id'] for experience in experiences if experience['reviews'])
+    _, full_etag = fetch(client, PAGE.format(profile='full'))
+    _, card_etag = fetch(client, PAGE.format(profile='card'))
+
+    user_id = rename_reviewer_of(app, experience_id, 'Renamed')
+
+    status, new_etag = fetch(client, PAGE.format(profile='full'), full_etag)
+    assert status == 200
+    assert new_etag != full_etag
+    experience = next(e for e in client.get(PAGE.format(profile='full')).get_json()['experiences'] if e['id'] == experience_id)
+    assert any(review['user_id'] == user_id and review['user_name'].startswith('Renamed ') for review in experience['reviews'])
+    # Cards show no reviews
+    assert fetch(client, PAGE.format(profile='card'), card_etag)[0] == 304
+
+
+def test_tag_and_reviewer_renames_change_full_booking_etags(app, client, sign_in):
+    headers = sign_in(BOOKER_ID)
+    path = '/bookings/?scope=past&profile=full&limit=5'
+    bookings = client.get(path, headers=headers).get_json()['bookings']
+    experience_id = next(booking['experience']['id'] for booking in bookings
+                         if booking['experience']['tags'] and booking['experience']['reviews'])
+
+    _, etag = fetch(client, path, headers=headers)
+    rename_tag_of(app, experience_id, 'Renamed Booking Tag')
+    status, tag_etag = fetch(client, path, etag, headers)
+    assert status == 200 and tag_etag != etag
+
+    rename_reviewer_of(app, experience_id, 'Rebooked')
+    status, reviewer_etag = fetch(client, path, tag_etag, headers)
+    assert status == 200 and reviewer_etag != tag_etag
@@ -0,0 +1,105 @@
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from extensions import db
+from models import Booking, IdempotencyKey
+from routes.idempotency import purge_expired_idempotency_keys
+
+USER_ID = 13
+OTHER_USER_ID = 14
+
+
+@pytest.fixture
+def experience_id(make_experience):
+    return make_experience(capacity=None)
+
+
+def booking(experience_id, guests=2, payment_method_id=USER_ID):
+    day = date.today() + timedelta(days=3)
+    return {
+        'experience_id': experience_id,
+        'number_of_guests': guests,
+        'payment_method_id': payment_method_id,
+        'reservations': [{'date': f"{day}T18:00:00", 'time_slot': f"{day}T18:00:00"}]
+    }
+
+
+def post(client, headers, payload, key):
+    return client.post('/bookings/', json=payload, headers=headers | {'Idempotency-Key': key})
+
+
+def booking_count(app, experience_id):
+    with app.app_context():
+        return Booking.query.filter_by(experience_id=experience_id).count()
+
+
+def test_retry_replays_the_first_response(app, client, sign_in, experience_id):
+    headers = sign_in(USER_ID)
+    key = str(uuid.uuid4())
+
+    first = post(client, headers, booking(experience_id), key)
+    retry = post(client, headers, booking(experience_id), key)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json() == first.get_json()
+    assert booking_count(app, experience_id) == 1
+
+
+def test_requests_without_a_key_are_not_deduplicated(app, client, sign_in, experience_id):
+    headers = sign_in(USER_ID)
+
+    assert client.post('/bookings/', json=booking(experience_id), headers=headers).status_code == 201
+    assert client.post('/bookings/', json=booking(experience_id), headers=headers).status_code == 201
+    assert booking_count(app, experience_id) == 2
+
+
+def test_same_key_with_a_different_payload_is_refused(app, client, sign_in, experience_id):
+    headers = sign_in(USER_ID)
+    key = str(uuid.uuid4())
+    assert post(client, headers, booking(experience_id), key).status_code == 201
+
+    response = post(client, headers, booking(experience_id, guests=3), key)
+
+    assert response.status_code == 422
+    assert booking_count(app, experience_id) == 1
+
+
+def test_keys_belong_to_one_user(app, client, sign_in, experience_id):
+    key = str(uuid.uuid4())
+
+    assert post(client, sign_in(USER_ID), booking(experience_id), key).status_code == 201
+    other = post(client, sign_in(OTHER_USER_ID), booking(experience_id, payment_method_id=OTHER_USER_ID), key)
+
+    assert other.status_code == 201
+    assert booking_count(app, experience_id) == 2
+
+
+def test_request_still_in_flight_is_refused(app, client, sign_in, experience_id):
+    key = str(uuid.uuid4())
+    # Claimed by a request that hasn't stored its response yet
+    with app.app_context():
+        db.session.add(IdempotencyKey(user_id=USER_ID, key=key, endpoint='bookings.create_booking', request_hash='0' * 64))
+        db.session.commit()
+
+    response = post(client, sign_in(USER_ID), booking(experience_id), key)
+
+    assert response.status_code == 409
+    assert booking_count(app, experience_id) == 0
+
+
+def test_purge_removes_only_expired_keys(app):
+    expired, fresh = str(uuid.uuid4()), str(uuid.uuid4())
+    with app.app_context():
+        db.session.add_all([
+            IdempotencyKey(user_id=USER_ID, key=expired, endpoint='bookings.create_booking', request_hash='0' * 64,
+                           created_at=datetime.now(timezone.utc) - timedelta(hours=25)),
+            IdempotencyKey(user_id=USER_ID, key=fresh, endpoint='bookings.create_booking', request_hash='0' * 64)
+        ])
+        db.session.commit()
+
+        assert purge_expired_idempotency_keys() >= 1
+
+        remaining = {record.key for record in IdempotencyKey.query.filter(IdempotencyKey.key.in_([expired, fresh]))}
+        assert remaining == {fresh}
@@ -0,0 +1,36 @@
+from argparse import Namespace
+
+from benchmarks.index_audit import audit, build_checks
+from extensions import db
+
+
+def test_endpoint_queries_use_indexes(app):
+    with app.app_context():
+        results = audit(db.session, build_checks(Namespace(user_id=1, experience_id=1)))
+
+    assert [name for name, scanned in results if scanned] == []
+
+
+def test_audit_covers_route_queries(app):
+    names = [name for name, _, _ in build_checks(Namespace(user_id=1, experience_id=1))]
+
+    for listing in ('first page', 'next page by title', 'tag filter', 'location filter', 'price filter', 'rating filter'):
+        assert f"experiences listing: {listing}" in names
+    for check in ('my bookings', 'my current bookings', 'my past bookings, next page',
+                  'reviews of an experience', 'reviews of an experience, next page', 'reviews by an author'):
+        assert check in names
+
+
+def test_audit_reports_a_missing_index(app):
+    with app.app_context():
+        index = next(index for index in db.metadata.tables['experiences'].indexes if index.name == 'ix_experiences_title_id')
+        index.drop(db.engine)
+        # Pooled connections cache EXPLAIN statements with their old plans
+        db.engine.dispose()
+        try:
+            results = dict(audit(db.session, build_checks(Namespace(user_id=1, experience_id=1))))
+        finally:
+            index.create(db.engine)
+            db.engine.dispose()
+
+    assert results['experiences listing: first page by title'] == ['experiences']
@@ -0,0 +1,51 @@
+import pytest
+from sqlalchemy import func, select
+
+from extensions import db
+from models import Booking, Review
+from query_stats import query_budget
+from response_cache import response_cache
+
+# (path, most statements it may run). Budgets include the token's user lookup
+# and the response cache's change check, which a warm request skips.
+BUDGETS = [
+    ('/bookings/', 7),
+    ('/bookings/?profile=card', 5),
+    ('/bookings/?scope=current', 5),
+    ('/bookings/?scope=past', 5),
+    ('/bookings/?scope=past&profile=full', 7),
+    ('/bookings/?scope=past&limit=100', 5),
+    ('/experiences/', 7),
+    ('/experiences/?profile=card', 5),
+    ('/experiences/?profile=card&limit=100', 5),
+    ('/experiences/?sort=-rating&tag=2', 6),
+    ('/reviews/', 2),
+    ('/reviews/?experience_id={experience_id}', 2),
+    ('/reviews/?experience_id={experience_id}&limit=100', 2),
+    ('/reviews/?user_id={user_id}', 2),
+]
+
+
+@pytest.fixture(scope='module')
+def busiest(app):
+    # The user with the most bookings and the experience with the most
+    # reviews, so every list is long enough for a lazy load per row to show
+    with app.app_context():
+        user_id = db.session.execute(
+            select(Booking.user_id).group_by(Booking.user_id).order_by(func.count().desc()).limit(1)
+        ).scalar()
+        experience_id = db.session.execute(
+            select(Review.experience_id).group_by(Review.experience_id).order_by(func.count().desc()).limit(1)
+        ).scalar()
+    return {'user_id': user_id, 'experience_id': experience_id}
+
+
+@pytest.mark.parametrize('path, budget', BUDGETS)
+def test_query_budget(client, sign_in, busiest, path, budget):
+    headers = sign_in(busiest['user_id'])
+    # Measure a cache miss, not a stored response
+    response_cache.clear()
+    with query_budget(budget):
+        response = client.get(path.format(**busiest), headers=headers)
+
+    assert response.status_code == 200
@@ -0,0 +1,58 @@
+from sqlalchemy import update
+
+from extensions import db
+from models import Experience
+from query_stats import count_queries
+from response_cache import response_cache
+
+ADMIN_ID = 1
+
+
+def queries_for(client, path):
+    with count_queries() as stats:
+        response = client.get(path)
+    assert response.status_code == 200
+    return stats.count, response.get_json()
+
+
+def test_cached_responses_run_no_queries(client):
+    response_cache.clear()
+    queries_for(client, '/experiences/20')
+
+    assert queries_for(client, '/experiences/20')[0] == 0
+
+
+def test_local_write_keeps_unrelated_entries(app, client, sign_in):
+    response_cache.clear()
+    queries_for(client, '/experiences/21')
+    queries_for(client, '/tags/')
+
+    updated = client.put('/experiences/22', json={'title': 'Lantern Festival Walk'}, headers=sign_in(ADMIN_ID))
+    assert updated.status_code == 200
+    with app.app_context():
+        response_cache.changes.check()
+
+    assert queries_for(client, '/experiences/21')[0] == 0
+    assert queries_for(client, '/tags/')[0] == 0
+    assert queries_for(client, '/experiences/22')[1]['experience']['title'] == 'Lantern Festival Walk'
+
+
+def test_watcher_invalidates_writes_from_elsewhere(app, client):
+    response_cache.clear()
+    with app.app_context():
+        response_cache.changes.check()
+    queries_for(client, '/experiences/23')
+    queries_for(client, '/tags/')
+
+    with app.app_context():
+        # A Core statement skips the session hooks, as another worker's write would
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(Experience).where(Experience.id == 23).values(title='Moonlit Kayak Tour', version=Experience.version + 1)
+            )
+        response_cache.changes.check()
+
+    count, body = queries_for(client, '/experiences/23')
+    assert count > 0
+    assert body['experience']['title'] == 'Moonlit Kayak Tour'
+    assert queries_for(client, '/tags/')[0] == 0
@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import update
+
+from extensions import db
+from models import Experience, Tag
+from query_stats import count_queries
+from search_index import search_index
+
+
+@pytest.fixture
+def no_rebuilds(monkeypatch):
+    def build():
+        raise AssertionError('the search index was rebuilt')
+    monkeypatch.setattr(search_index, 'build', build)
+
+
+def test_search_runs_no_queries(client):
+    with count_queries() as stats:
+        response = client.get('/search?q=wine tasting')
+
+    assert response.status_code == 200
+    assert response.get_json()['experiences']
+    assert stats.count == 0
+
+
+def test_tag_rename_refreshes_tagged_documents(app, no_rebuilds):
+    with app.app_context():
+        tag = db.session.get(Tag, 3)
+        tagged = {experience.id for experience in tag.experiences}
+        tag.name = 'Quixotic Quests'
+        db.session.commit()
+
+    assert tagged
+    assert all('quixotic quests' in search_index.documents[experience_id]['fields']['tags'] for experience_id in tagged)
+    assert search_index.search('quixotic quests')[0]['match_type'] == 'tags'
+
+
+def test_watcher_refreshes_writes_from_elsewhere(app, no_rebuilds):
+    with app.app_context():
+        search_index.changes.check()
+        # A Core statement skips the session hooks, as another worker's write would
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(Experience).where(Experience.id == 30).values(title='Xylophone Recital', version=Experience.version + 1)
+            )
+        assert search_index.suggestions('xylophone') == []
+        search_index.changes.check()
+
+    assert search_index.suggestions('xylophone') == [{'id': 30, 'title': 'Xylophone Recital'}]
@@ -0,0 +1,50 @@
+from sqlalchemy import update
+
+from extensions import db
+from models import Booking, Experience
+from query_stats import count_queries
+from suggest_index import suggest_index
+
+
+def suggested_ids(client, query):
+    return [suggestion['id'] for suggestion in client.get(f"/search/suggest?q={query}").get_json()['suggestions']]
+
+
+def test_suggest_does_not_query_the_database(client):
+    client.get('/search/suggest?q=wi')
+    with count_queries() as stats:
+        response = client.get('/search/suggest?q=wine')
+
+    assert response.status_code == 200
+    assert stats.count == 0
+
+
+def test_watcher_applies_titles_written_elsewhere(app, client):
+    with app.app_context():
+        # A Core statement skips the session hooks, as another worker's write would
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(Experience).where(Experience.id == 5).values(title='Zanzibar Spice Walk', version=Experience.version + 1)
+            )
+        assert 5 not in suggested_ids(client, 'zanzibar')
+        suggest_index.changes.check()
+
+    assert suggested_ids(client, 'zanzibar') == [5]
+
+
+def test_watcher_skips_local_commits_and_bookings(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(suggest_index.changes, 'on_change', lambda *changed: calls.append(changed))
+    with app.app_context():
+        suggest_index.changes.check()
+        calls.clear()
+
+        experience = db.session.get(Experience, 6)
+        experience.title = 'Yodel Lessons in the Alps'
+        db.session.commit()
+        with db.engine.begin() as connection:
+            connection.execute(update(Booking).where(Booking.id == 1).values(version=Booking.version + 1))
+        suggest_index.changes.check()
+
+    assert calls == []
+    assert suggest_index.suggest('yodel')[0]['id'] == 6
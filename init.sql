@@ -7,10 +7,12 @@ DROP TABLE IF EXISTS experience_schedules CASCADE;
 DROP TABLE IF EXISTS bundles CASCADE;
 DROP TABLE IF EXISTS bundle_experiences CASCADE;
 DROP TABLE IF EXISTS bookings CASCADE;
+DROP TABLE IF EXISTS reservations CASCADE;
 DROP TABLE IF EXISTS payments CASCADE;
 DROP TABLE IF EXISTS reviews CASCADE;
 DROP TABLE IF EXISTS tags CASCADE;
 DROP TABLE IF EXISTS experience_tags CASCADE;
+DROP TABLE IF EXISTS idempotency_keys CASCADE;
 
 CREATE TABLE users (
   id SERIAL PRIMARY KEY,
@@ -21,7 +23,11 @@ CREATE TABLE users (
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   last_login TIMESTAMP,
   phone VARCHAR(20),
-  admin BOOLEAN DEFAULT FALSE
+  admin BOOLEAN DEFAULT FALSE,
+  -- Bumped to revoke the user's tokens when credentials or role change
+  token_generation INTEGER NOT NULL DEFAULT 0,
+  -- Change counter for ETags
+  version INTEGER NOT NULL DEFAULT 1
 );
 
 CREATE TABLE payment_methods (
@@ -31,9 +37,16 @@ CREATE TABLE payment_methods (
   cvv VARCHAR(100),
   billing_zip VARCHAR(100),
   exp_month VARCHAR(10),
-  exp_year VARCHAR(10)
+  exp_year VARCHAR(10),
+  -- Removed cards stay for past payments but aren't listed
+  hidden BOOLEAN DEFAULT FALSE,
+  -- Change counter for ETags
+  version INTEGER NOT NULL DEFAULT 1
 );
 
+-- Per-user and per-experience lookup indexes, as migration 8b2d4e6f1a93 builds them
+CREATE INDEX ix_payment_methods_user_id_hidden_id ON payment_methods (user_id, hidden, id);
+
 CREATE TABLE referrals (
   id SERIAL PRIMARY KEY,
   user_id INTEGER REFERENCES users(id),
@@ -45,15 +58,29 @@ CREATE TABLE experiences (
   title VARCHAR(100),
   description TEXT,
   location VARCHAR(100),
-  price NUMERIC
+  price NUMERIC,
+  review_count INTEGER NOT NULL DEFAULT 0,
+  rating_sum INTEGER NOT NULL DEFAULT 0,
+  average_rating NUMERIC(3, 2),
+  -- Change counter for ETags
+  version INTEGER NOT NULL DEFAULT 1
 );
 
+-- Keyset pagination of the experience listing orders by (sort key, id)
+CREATE INDEX ix_experiences_title_id ON experiences (title, id);
+CREATE INDEX ix_experiences_price_id ON experiences (coalesce(price, 0), id);
+CREATE INDEX ix_experiences_rating_id ON experiences (coalesce(average_rating, 0), id);
+-- Case-insensitive location prefix filter (LIKE 'prefix%')
+CREATE INDEX ix_experiences_location_lower ON experiences (lower(location) text_pattern_ops);
+
 CREATE TABLE experience_images (
   id SERIAL PRIMARY KEY,
   experience_id INTEGER REFERENCES experiences(id),
   image_url TEXT
 );
 
+CREATE INDEX ix_experience_images_experience_id ON experience_images (experience_id);
+
 CREATE TABLE experience_schedules (
   id SERIAL PRIMARY KEY,
   experience_id INTEGER REFERENCES experiences(id),
@@ -62,7 +89,9 @@ CREATE TABLE experience_schedules (
   recurring_pattern VARCHAR(50),
   days_of_week VARCHAR(50),
   start_time TIME,
-  end_time TIME
+  end_time TIME,
+  -- Maximum guests per day across all bookings; NULL means unlimited
+  capacity INTEGER
 );
 
 CREATE TABLE bundles (
@@ -78,6 +107,9 @@ CREATE TABLE bundle_experiences (
   experience_id INTEGER REFERENCES experiences(id)
 );
 
+CREATE INDEX ix_bundle_experiences_bundle_id_experience_id ON bundle_experiences (bundle_id, experience_id);
+CREATE INDEX ix_bundle_experiences_experience_id_bundle_id ON bundle_experiences (experience_id, bundle_id);
+
 CREATE TABLE bookings (
   id SERIAL PRIMARY KEY,
   user_id INTEGER REFERENCES users(id),
@@ -85,20 +117,27 @@ CREATE TABLE bookings (
   number_of_guests INTEGER,
   confirmation_code VARCHAR(50),
   bundle_id INTEGER,
-  FOREIGN KEY (experience_id) REFERENCES experiences(id),
-  FOREIGN KEY (bundle_id) REFERENCES bundles(id),
   status VARCHAR(50) DEFAULT 'Pending',
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  -- Change counter for ETags
+  version INTEGER NOT NULL DEFAULT 1,
+  FOREIGN KEY (experience_id) REFERENCES experiences(id),
+  FOREIGN KEY (bundle_id) REFERENCES bundles(id)
 );
 
+CREATE INDEX ix_bookings_user_id_id ON bookings (user_id, id);
+CREATE INDEX ix_bookings_experience_id ON bookings (experience_id);
+
 CREATE TABLE reservations (
   id SERIAL PRIMARY KEY,
   booking_id INTEGER REFERENCES bookings(id) on DELETE CASCADE,
   date DATE NOT NULL,
   time_slot TIME NOT NULL,
   status VARCHAR(50) DEFAULT 'Pending',
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-)
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX ix_reservations_booking_id_date ON reservations (booking_id, date);
 
 CREATE TABLE payments (
   id SERIAL PRIMARY KEY,
@@ -109,6 +148,8 @@ CREATE TABLE payments (
   status VARCHAR(50)
 );
 
+CREATE INDEX ix_payments_user_id ON payments (user_id);
+
 CREATE TABLE reviews (
   id SERIAL PRIMARY KEY,
   user_id INTEGER REFERENCES users(id),
@@ -118,10 +159,15 @@ CREATE TABLE reviews (
   timestamp TIMESTAMP
 );
 
+CREATE INDEX ix_reviews_experience_id_id ON reviews (experience_id, id);
+CREATE INDEX ix_reviews_user_id_id ON reviews (user_id, id);
+
 CREATE TABLE tags (
   id SERIAL PRIMARY KEY,
   name VARCHAR(50),
-  description TEXT
+  description TEXT,
+  -- Change counter for ETags
+  version INTEGER NOT NULL DEFAULT 1
 );
 
 CREATE TABLE experience_tags (
@@ -130,14 +176,34 @@ CREATE TABLE experience_tags (
   experience_id INTEGER REFERENCES experiences(id)
 );
 
+CREATE INDEX ix_experience_tags_tag_id_experience_id ON experience_tags (tag_id, experience_id);
+CREATE INDEX ix_experience_tags_experience_id_tag_id ON experience_tags (experience_id, tag_id);
+
+-- Stored responses for retried writes sent with an Idempotency-Key header
+CREATE TABLE idempotency_keys (
+  id SERIAL PRIMARY KEY,
+  user_id INTEGER NOT NULL REFERENCES users(id),
+  key VARCHAR(255) NOT NULL,
+  endpoint VARCHAR(100) NOT NULL,
+  request_hash VARCHAR(64) NOT NULL,
+  status_code INTEGER,
+  response_body TEXT,
+  created_at TIMESTAMP,
+  CONSTRAINT uq_idempotency_keys_user_key UNIQUE (user_id, key)
+);
+
+CREATE INDEX ix_idempotency_keys_created_at ON idempotency_keys (created_at);
+
 
 -- Sample Data Seeding
 
 -- Insert Users
+-- argon2 hashes of password1, password2 and password3, at the default
+-- ARGON2_* settings
 INSERT INTO users (first_name, last_name, email, password_hash, phone, admin) VALUES
-('Red', 'Ruby', 'red@example.com', 'password1', '1234567890', false),
-('Blue', 'Sapphire', 'blue@example.com', 'password2', '0987654321', false),
-('Green', 'Emerald', 'green@example.com', 'password3', '1122334455', false);
+('Red', 'Ruby', 'red@example.com', '$argon2id$v=19$m=65536,t=3,p=4$ghqweWDHX/0X0kNaHIIbEQ$82hpqEbBEwihKQ1xoDhtN9yM4gYjTqJBk/D6apsWs8k', '1234567890', false),
+('Blue', 'Sapphire', 'blue@example.com', '$argon2id$v=19$m=65536,t=3,p=4$sES1TSxsCqTUiExsV0jl4Q$lbc9JX6T3RanOwUOvm4wjzIJejlu+svXeIylbXTfGmY', '0987654321', false),
+('Green', 'Emerald', 'green@example.com', '$argon2id$v=19$m=65536,t=3,p=4$9emxkX5IscnVYg5l8ECctQ$NjPFluv3QTaJBfF1+go0RMv/nma4N5D4jeEIpeZVtjc', '1122334455', false);
 
 -- Add sample payment methods
 INSERT INTO payment_methods (user_id, card_number, cvv, billing_zip, exp_month, exp_year) VALUES
@@ -191,6 +257,12 @@ INSERT INTO reviews (user_id, experience_id, rating, comment, timestamp) VALUES
 (2, 3, 4, 'Great hike but a bit challenging.', NOW()),
 (3, 5, 3, 'Nice cruise but could be better.', NOW());
 
+-- Rating aggregates for the reviews above (Experience.refresh_rating_aggregates)
+UPDATE experiences SET
+  review_count = (SELECT count(reviews.id) FROM reviews WHERE reviews.experience_id = experiences.id),
+  rating_sum = (SELECT coalesce(sum(reviews.rating), 0) FROM reviews WHERE reviews.experience_id = experiences.id),
+  average_rating = (SELECT round(avg(reviews.rating), 2) FROM reviews WHERE reviews.experience_id = experiences.id);
+
 -- Experience Schedules (for each experience, define a schedule)
 INSERT INTO experience_schedules (experience_id, start_date, end_date, recurring_pattern, days_of_week, start_time, end_time) VALUES
 (1, '2025-05-01', '2025-05-01', 'None', 'Monday, Wednesday, Friday', '09:00:00', '11:00:00'),
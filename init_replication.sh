@@ -0,0 +1,3 @@
+#!/bin/bash
+# Lets db_replica stream from this server with the same credentials
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
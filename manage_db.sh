@@ -15,6 +15,7 @@ show_menu() {
   echo -e "${YELLOW}4)${NC} Generate realistic test data"
   echo -e "${YELLOW}5)${NC} View database status"
   echo -e "${YELLOW}6)${NC} Export database connection for React Native"
+  echo -e "${YELLOW}7)${NC} Apply database migrations"
   echo -e "${YELLOW}0)${NC} Exit"
   echo
   echo -n "Select an option: "
@@ -105,6 +106,13 @@ export_connection() {
   echo -e "\n${YELLOW}Note: This assumes your React Native app and database are on the same network.${NC}"
 }
 
+# Apply Alembic migrations (search indexes, etc.) through Flask-Migrate
+migrate_db() {
+  echo -e "${YELLOW}Applying database migrations...${NC}"
+  (cd backend && flask --app app db upgrade)
+  echo -e "${GREEN}Migrations applied!${NC}"
+}
+
 # Main loop
 while true; do
   show_menu
@@ -117,6 +125,7 @@ while true; do
     4) generate_test_data ;;
     5) show_status ;;
     6) export_connection ;;
+    7) migrate_db ;;
     0) echo "Goodbye!"; exit 0 ;;
     *) echo -e "${RED}Invalid option${NC}" ;;
   esac